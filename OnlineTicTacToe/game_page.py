@@ -37,8 +37,6 @@ class FriendGame(tk.Frame):
         self.configure(height=650, width=550)
         self.pack_propagate(False)
 
-        self._cur_music: pg.mixer.Sound = self.master.win_music
-
         if not self.master.lang_flag:
             self._: Callable = lambda s: s
         else:
@@ -55,18 +53,24 @@ class FriendGame(tk.Frame):
         self.opponent_id: Optional[str] = None
         self.is_draw_flag: bool = False
         self.opponent_reset: bool = False
+        self.binary: bool = False
+        self.opponent_away: bool = False
 
         self.master.now_game = True
 
         self.sio: socketio.Client = socketio.Client()
         self.master.sio = self.sio
         self.sio.on('info', self.on_info)
-        self.sio.on('start_game', self.on_start_game)
+        self.sio.on('start_game', lambda: self.after(0, self.on_start_game))
         self.sio.on('opponent_reset', self.on_opponent_reset)
         self.sio.on('update_game_over', self.on_update_game_over)
         self.sio.on('update_board', self.on_update_board)
+        self.sio.on('resume', self.on_resume)
+        self.sio.on('opponent_away', self.on_opponent_away)
+        self.sio.on('opponent_back', self.on_opponent_back)
         self.sio.connect(f'https://tictactoegame.serveo.net?'
-                         f'game_id={self.master.game_id}&user_id={self.master.user_id}')
+                         f'game_id={self.master.game_id}&user_id={self.master.user_id}&protocol=binary',
+                         headers={'Cookie': f"token={self.master.token.get('token')}"}, transports=['websocket'])
 
         self._user1_sign: Optional[str] = self.sign
         self._user2_sign: Optional[str] = self.opponent_sign
@@ -75,8 +79,6 @@ class FriendGame(tk.Frame):
         self._player_sign_msg: str = f"{self.master.user}:  {self._user1_sign}       {self._user2}:  {self._user2_sign}"
 
         self._free_squares: List[int] = list(range(9))
-        self._win_pos: Tuple[Tuple[int, ...], ...] = ((0, 1, 2), (3, 4, 5), (6, 7, 8), (0, 3, 6),
-                                                      (1, 4, 7), (2, 5, 8), (0, 4, 8), (2, 4, 6))
         self._color: Dict[str, str] = {"X": "red", "O": "blue"}
         self._end_game: bool = False
         self._return_btn_flag: bool = False
@@ -89,15 +91,11 @@ class FriendGame(tk.Frame):
 
         self._create_widgets()
 
-        self.after(10000, lambda: self.sio.emit('check_opponent', data={'game_id': self.master.game_id,
-                                                                        'user_id': self.master.user_id,
-                                                                        'opponent_id': self.opponent_id}))
-
     def on_start_game(self) -> None:
         """
         Make actions for start the game.
 
-        Receive a message from the server_dir about the start of the game.
+        Receive a message from the server_dir about the start of the game, which is sent when both players connect.
         Prepare the field and status messages so that you can start the game.
         """
         self.start_flag = True
@@ -115,59 +113,65 @@ class FriendGame(tk.Frame):
 
         self._return_btn.config(state='normal')
 
-    def on_update_game_over(self, data: Dict[str, Union[str, int, bool]]) -> None:
+    def on_update_game_over(self, data: Union[Dict[str, Union[str, int, bool, None]], bytes]) -> None:
         """
-        Perform actions to end the game if the opponent wins.
+        Perform actions to end the game when the server tells its result.
 
-        :param data: Dictionary with data about the end of the game
-        :type data: class `dict[str, str | int | bool]`
+        :param data: Dictionary with the last move, the winner and the winning positions if the game is not drawn,
+                     or the same data encoded by the compact protocol
+        :type data: class `dict[str, str | int | bool | None]` or `bytes`
         """
-        is_draw = bool(data['is_draw'])
+        if isinstance(data, bytes):
+            data = self._decode_game_over(data)
+
         square = data['pos']
-        self._field[square]["text"] = self.opponent_sign
-        self._field[square]["disabledforeground"] = self._color[self.opponent_sign]
-        self._free_squares.remove(square)
+        if square in self._free_squares:
+            self._field[square]["text"] = self.opponent_sign
+            self._field[square]["disabledforeground"] = self._color[self.opponent_sign]
+            self._free_squares.remove(square)
 
-        if is_draw:
-            self._end_game = True
+        self._end_game = True
+        for elem in self._free_squares:
+            self._field[elem]["state"] = "disabled"
+
+        if data['is_draw']:
+            self.master.draw_music.play()
             self.is_draw_flag = True
             self._status_msg = self._("It is a draw")
-            self._status.config(text=self._status_msg)
-            self._cur_music = self.master.draw_music
             for elem in self._field:
                 elem["background"] = "#F0E68C"
-            self.sio.emit('leave', data={'game_id': self.master.game_id, 'user_id': self.master.user_id})
             self._update_statistic(0)
-            self.master.now_game = False
-            self._bind_return_btn()
+        elif data['winner'] == self.master.user_id:
+            self.master.win_music.play()
+            self.win_flag = True
+            self._status_msg = self._("{player} win").format(player=self.master.user)
+            self._field[data['a']]["background"], self._field[data['b']]["background"], \
+                self._field[data['c']]["background"] = self._end_game_color()
+            self._status.config(fg='green')
+            self._update_statistic(1)
         else:
             self.master.defeat_music.play()
-            pos_a = data['a']
-            pos_b = data['b']
-            pos_c = data['c']
-            self._end_game = True
             self.win_flag = False
             self._status_msg = self._("{player} win").format(player=self.opponent)
-            self._status.config(text=self._status_msg)
-            self._field[pos_a]["background"], self._field[pos_b]["background"], self._field[pos_c]["background"] = \
-                "#F08080", "#F08080", "#F08080"
-            for elem in self._free_squares:
-                self._field[elem]["state"] = "disabled"
-            self._status["text"] = self._status_msg
+            self._field[data['a']]["background"], self._field[data['b']]["background"], \
+                self._field[data['c']]["background"] = "#F08080", "#F08080", "#F08080"
             self._status.config(fg='red')
-            self.sio.emit('leave', data={'game_id': self.master.game_id, 'user_id': self.master.user_id})
             self._update_statistic(2)
-            self.master.now_game = False
-            self._bind_return_btn()
 
-    def on_update_board(self, data: Dict[str, int]) -> None:
+        self._status["text"] = self._status_msg
+        self.sio.emit('leave', data={'game_id': self.master.game_id, 'user_id': self.master.user_id})
+        self.master.now_game = False
+        self._bind_return_btn()
+
+    def on_update_board(self, data: Union[Dict[str, int], bytes]) -> None:
         """
         Perform actions to update the field and status messages after the opponent's move.
 
-        :param data: Dictionary with the information about the opponent turn from the server_dir
-        :type data: class: `dict[str, int]`
+        :param data: Dictionary with the information about the opponent turn from the server_dir,
+                     or the move encoded by the compact protocol
+        :type data: class: `dict[str, int]` or `bytes`
         """
-        square = data['pos']
+        square = data[0] & 0xF if isinstance(data, bytes) else data['pos']
         self._field[square]["text"] = self.opponent_sign
         self._field[square]["disabledforeground"] = self._color[self.opponent_sign]
         self._free_squares.remove(square)
@@ -178,6 +182,48 @@ class FriendGame(tk.Frame):
         for elem in self._free_squares:
             self._field[elem]["state"] = "normal"
 
+    def on_resume(self, data: Union[Dict[str, List[int]], bytes]) -> None:
+        """
+        Restore the field and status messages after reconnecting to the game.
+
+        :param data: Dictionary with the squares of the moves made in the game in their order,
+                     or the same squares encoded by the compact protocol one byte per move
+        :type data: class: `dict[str, list[int]]` or `bytes`
+        """
+        moves = list(data) if isinstance(data, bytes) else data['moves']
+        first = self.turn == "Your turn"
+
+        self._free_squares = list(range(9))
+        for elem in self._field:
+            elem["text"] = ' '
+            elem["state"] = "disabled"
+        for number, square in enumerate(moves):
+            sign = self.sign if (number % 2 == 0) == first else self.opponent_sign
+            self._field[square]["text"] = sign
+            self._field[square]["disabledforeground"] = self._color[sign]
+            self._free_squares.remove(square)
+
+        self.start_flag = True
+        self.turn_flag = (len(moves) % 2 == 0) == first
+        if self.turn_flag:
+            self._status_msg = self._("Now your turn")
+            for elem in self._free_squares:
+                self._field[elem]["state"] = "normal"
+        else:
+            self._status_msg = self._("Waiting for the opponent turn")
+        self._status.config(text=self._status_msg)
+        self._return_btn.config(state='normal')
+
+    def on_opponent_away(self) -> None:
+        """Tell the player that the opponent has lost the connection and can still come back."""
+        self.opponent_away = True
+        self._status.config(text=self._("{player} lost the connection").format(player=self.opponent))
+
+    def on_opponent_back(self) -> None:
+        """Tell the player that the opponent has reconnected."""
+        self.opponent_away = False
+        self._status.config(text=self._status_msg)
+
     def on_opponent_reset(self) -> None:
         """Perform actions if the opponent has left the game."""
         self.master.win_music.play()
@@ -206,11 +252,35 @@ class FriendGame(tk.Frame):
         self.opponent_id = data['opponent_id']
         self.master.opponent_id = self.opponent_id
         self.opponent_sign = data['opponent_sign']
+        self.binary = data.get('protocol') == 'binary'
+
+    def _decode_game_over(self, data: bytes) -> Dict[str, Union[str, int, bool, None]]:
+        """
+        Decode the result of the game sent by the compact protocol.
+
+        The first byte is the last move with the move number in the upper and the square in the lower 4 bits,
+        the second byte is 0 for a draw or the number of the winner plus 1, where 1 is the player who moved first,
+        and the last three bytes are the winning positions.
+
+        :param data: Encoded result of the game
+        :type data: class: `bytes`
+        :return: Dictionary with the last move, the winner and the winning positions if the game is not drawn
+        :rtype: class `dict[str, str | int | bool | None]`
+        """
+        if data[1] == 0:
+            return {'is_draw': True, 'pos': data[0] & 0xF, 'winner': None}
+
+        first = self.turn == "Your turn"
+        winner = self.master.user_id if (data[1] == 1) == first else self.opponent_id
+        return {'is_draw': False, 'pos': data[0] & 0xF, 'winner': winner, 'a': data[2], 'b': data[3], 'c': data[4]}
 
     def _click(self, square: int) -> None:
         """
         Set action for a button that is an element of the game field.
 
+        The server checks the move and tells both players if it ends the game. A move made while the connection
+        is lost is not sent, and the field is restored from the server when the connection is back.
+
         :param square: The position chosen by the player
         :type square: class `int`
         """
@@ -219,87 +289,16 @@ class FriendGame(tk.Frame):
         self._free_squares.remove(square)
         for elem in self._free_squares:
             self._field[elem]["state"] = "disabled"
-        result = self._check_win()
-        self._if_end_game(result, square)
         self._change_status()
-        if not self._end_game:
-            self.sio.emit('play', data={'game_id': self.master.game_id, 'pos': square,
-                                        'user_id': self.master.user_id, 'opponent_id': self.opponent_id})
-
-    def _set_end_game(self, pos_a: int, pos_b: int, pos_c: int) -> None:
-        """
-        Set the end of the game, tells which player won and repaints the field in the appropriate color.
-
-        :param pos_a: The first of three positions from which a win is obtained
-        :type pos_a: class: `int`
-        :param pos_b: The second of the three positions from which a win is obtained
-        :type pos_b: class: `int`
-        :param pos_c: The third of the three positions from which a win is obtained
-        :type pos_c: class: `int`
-        """
-        self._end_game = True
-        self._status_msg = self._("{player} win").format(player=self.master.user)
-        self.win_flag = True
-        self._field[pos_a]["background"], self._field[pos_b]["background"], self._field[pos_c]["background"] = \
-            self._end_game_color()
-
-    def _if_drawn_game(self) -> None:
-        """Check whether the game ended in a draw and performs the appropriate actions."""
-        if not self._free_squares:
-            self._end_game = True
-            self.is_draw_flag = True
-            self._status_msg = self._("It is a draw")
-            self._cur_music = self.master.draw_music
-            for elem in self._field:
-                elem["background"] = "#F0E68C"
-            self._update_statistic(0)
-
-    def _check_win(self) -> Optional[Tuple[int, int, int]]:
-        """
-        Check whether the game ended with a victory for player, otherwise causes a check for a draw.
-
-        :return: A tuple with a player's winning position or None
-        :rtype: class: `tuple[int, int, int]` or None
-        """
-        for pos_a, pos_b, pos_c in self._win_pos:
-            if (self._field[pos_a]["text"] == self.sign) and (self._field[pos_b]["text"] == self.sign) and \
-               (self._field[pos_c]["text"] == self.sign):
-                self._set_end_game(pos_a, pos_b, pos_c)
-                self._update_statistic(1)
-                return pos_a, pos_b, pos_c
-
-        self._if_drawn_game()
-        return None
-
-    def _if_end_game(self, result: Optional[Tuple], square: int) -> None:
-        """
-        Make some actions if the game is over.
-
-        Perform the actions to be performed if the game is over.
-        Send a message to the server_dir that the game is finished.
-
-        :param result: A tuple with a player's winning position
-        :type result: class: `tuple` or None
-        :param square: The position that the player went to and which led to the end of the game
-        :type square: class: `int`
-        """
-        if self._end_game:
-            self._cur_music.play()
-            for elem in self._free_squares:
-                self._field[elem]["state"] = "disabled"
-            self._status["text"] = self._status_msg
-            if not self.is_draw_flag:
-                self._status.config(fg='green')
-            if result is None:
-                self.sio.emit('game_over', data={'game_id': self.master.game_id, 'pos': square,
-                                                 'opponent_id': self.opponent_id, 'is_draw': self.is_draw_flag})
+        seq = 8 - len(self._free_squares)
+        try:
+            if self.binary:
+                self.sio.emit('play', data=bytes((seq << 4 | square,)))
             else:
-                self.sio.emit('game_over', data={'game_id': self.master.game_id, 'pos': square,
-                                                 'opponent_id': self.opponent_id, 'is_draw': self.is_draw_flag,
-                                                 'a': result[0], 'b': result[1], 'c': result[2]})
-            self.sio.emit('leave', data={'game_id': self.master.game_id, 'user_id': self.master.user_id})
-            self.master.now_game = False
-            self._bind_return_btn()
+                self.sio.emit('play', data={'game_id': self.master.game_id, 'pos': square, 'seq': seq,
+                                            'user_id': self.master.user_id, 'opponent_id': self.opponent_id})
+        except socketio.exceptions.SocketIOError:
+            pass
 
     def _draw_sign(self, square: int) -> None:
         """
@@ -344,7 +343,9 @@ class FriendGame(tk.Frame):
 
     def _update_statistic(self, flag: int) -> None:
         """
-        Update statistics and sends them to the server_dir.
+        Update the statistics shown to the player.
+
+        The server records the result of the game itself.
 
         :param flag: Flag signaling the outcome of the game; 0 - drawn, 1 - win, 2 - defeat
         :type flag: class: `int`
@@ -356,15 +357,6 @@ class FriendGame(tk.Frame):
         elif flag == 2:
             self.master.friend_stat["Player2_win"] += 1
 
-        url = 'https://tictactoegame.serveo.net/update_friend_statistic'
-        headers = {'Content-Type': 'application/json'}
-        data = {'games_played': self.master.friend_stat["Player1_win"] + self.master.friend_stat["Player2_win"] +
-                self.master.friend_stat["drawn_game"],
-                'games_won': self.master.friend_stat['Player1_win'],
-                'games_draws': self.master.friend_stat['drawn_game'],
-                'games_defeat': self.master.friend_stat['Player2_win']}
-        requests.post(url, headers=headers, data=json.dumps(data), cookies=self.master.token)
-
     def _status_lbl(self) -> None:
         """Draw a label with the game status."""
         self._status = tk.Label(self, bg="white", font=self.master.font, text=self._status_msg, width=36, height=2)
@@ -448,6 +440,8 @@ class FriendGame(tk.Frame):
                     self._status.config(text=self._("{player} win").format(player=self.opponent))
                 else:
                     self._status.config(text=self._("{player} win").format(player=self.master.user))
+        elif self.opponent_away:
+            self._status.config(text=self._("{player} lost the connection").format(player=self.opponent))
         else:
             if self.start_flag:
                 if self.turn_flag:
@@ -608,14 +602,7 @@ class PcGame(tk.Frame):
         return None
 
     def _switch_frame(self) -> None:
-        """Send statistics to the server_dir and changes the page to the settings page of the game with the computer."""
-        url = 'https://tictactoegame.serveo.net/update_computer_statistic'
-        headers = {'Content-Type': 'application/json'}
-        data = {'games_played': self.master.pc_stat["Player_win"] + self.master.pc_stat["Computer_win"] +
-                self.master.pc_stat["drawn_game"],
-                'games_won': self.master.pc_stat['Player_win'],
-                'games_draws': self.master.pc_stat['drawn_game'], 'games_defeat': self.master.pc_stat['Computer_win']}
-        requests.post(url, headers=headers, data=json.dumps(data), cookies=self.master.token)
+        """Change the page to the settings page of the game with the computer."""
         self.master.switch_frame(setp.PcStartPage)
 
     def _bind_return_btn(self) -> None:
@@ -668,7 +655,7 @@ class PcGame(tk.Frame):
 
     def _update_statistic(self, flag: bool) -> None:
         """
-        Update player statistics.
+        Update player statistics and send the result of the game to the server_dir.
 
         :param flag: Flag indicating whether the game ended in a draw
         :type flag: class `bool`
@@ -678,6 +665,11 @@ class PcGame(tk.Frame):
         else:
             self.master.pc_stat["drawn_game"] += 1
 
+        url = 'https://tictactoegame.serveo.net/record_result'
+        headers = {'Content-Type': 'application/json'}
+        outcome = "draw" if not flag else "win" if self._cur_player == "Player" else "defeat"
+        requests.post(url, headers=headers, data=json.dumps({'outcome': outcome}), cookies=self.master.token)
+
     def _start_game_1(self) -> None:
         """Perform actions to start the game."""
         self.master.click_music.play()
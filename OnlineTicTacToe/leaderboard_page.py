@@ -0,0 +1,135 @@
+"""A module with the class of the page with the leaderboard of online games."""
+
+import tkinter as tk
+import os
+import sys
+import gettext
+from typing import Callable, Dict, List, Optional, Tuple, Union
+import requests
+import OnlineTicTacToe.start_page as stp
+
+
+translation = gettext.translation('tictactoe',
+                                  os.path.join(getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__))),
+                                               'locale'),
+                                  fallback=True)
+
+
+class LeaderboardPage(tk.Frame):
+    """
+    The class of the page with the users ordered by their ratings in online games.
+
+    The users are loaded from the server_dir page by page.
+
+    :param master: An instance of the main class of the game application
+    :type master: class: `tictactoe.App`
+    """
+
+    def __init__(self, master) -> None:
+        """Make constructor method."""
+        super().__init__(master)
+
+        self.master.cur_page = 'Leaderboard'
+
+        self.configure(height=650, width=550)
+        self.pack_propagate(False)
+
+        if not self.master.lang_flag:
+            self._: Callable = lambda s: s
+        else:
+            self._: Callable = translation.gettext
+
+        self.players: List[Dict[str, Union[str, int]]] = []
+        self.next: Optional[str] = None
+        self._pages: List[Tuple[Optional[str], int]] = []
+
+        self.label1: tk.Label = tk.Label()
+        self.table: tk.Frame = tk.Frame()
+        self.prev_btn: tk.Button = tk.Button()
+        self.next_btn: tk.Button = tk.Button()
+        self.return_btn: tk.Button = tk.Button()
+
+        self._create_widgets()
+        self.load_page(None, 0)
+
+    def load_page(self, after: Optional[str], rank: int) -> None:
+        """
+        Load a page of the leaderboard from the server_dir and show it.
+
+        :param after: Id of the user after whom the page starts, or None for the first page
+        :type after: class: `str` or None
+        :param rank: Place of the user after whom the page starts
+        :type rank: class: `int`
+        """
+        url = 'https://tictactoegame.serveo.net/leaderboard'
+        params = {'rank': rank} if after is None else {'after': after, 'rank': rank}
+        response = requests.get(url, params=params, cookies=self.master.token).json()
+
+        self._pages.append((after, rank))
+        self.players = response['players']
+        self.next = response['next']
+        self._draw_table()
+
+    def next_page(self) -> None:
+        """Set action for the "Next" button."""
+        self.load_page(self.next, self.players[-1]['place'])
+
+    def prev_page(self) -> None:
+        """Set action for the "Previous" button."""
+        self._pages.pop()
+        self.load_page(*self._pages.pop())
+
+    def _draw_table(self) -> None:
+        """Draw the rows of the users on the current page."""
+        for widget in self.table.winfo_children():
+            widget.destroy()
+
+        for row, player in enumerate(self.players):
+            color = "green" if player['user_id'] == self.master.user_id else "black"
+            for column, text in enumerate((player['place'], player['user'], player['rating'])):
+                tk.Label(self.table, font=self.master.btn_font, text=text, fg=color,
+                         width=6 if column != 1 else 25).grid(row=row, column=column)
+
+        self.prev_btn.config(state="normal" if len(self._pages) > 1 else "disabled")
+        self.next_btn.config(state="normal" if self.next is not None else "disabled")
+
+    def _create_widgets(self) -> None:
+        """Render widgets of the leaderboard page."""
+        self.label1 = tk.Label(self, font=self.master.font, text=self._("Leaderboard"))
+        self.label1.pack(side="top", pady=(15, 15))
+
+        self.table = tk.Frame(self)
+        self.table.pack(side="top", fill="both", expand=True)
+
+        frame = tk.Frame(self)
+        frame.pack(side="top", pady=(0, 5))
+
+        self.prev_btn = tk.Button(frame, bg="white", font=self.master.btn_font, text=self._("Previous"),
+                                  command=self.prev_page, width=14)
+        self.prev_btn.pack(side="left", padx=(0, 5))
+
+        self.next_btn = tk.Button(frame, bg="white", font=self.master.btn_font, text=self._("Next"),
+                                  command=self.next_page, width=14)
+        self.next_btn.pack(side="left")
+
+        self.return_btn = tk.Button(self, bg="white", font=self.master.btn_font, text=self._("Return to start page"),
+                                    command=lambda: self.master.switch_frame(stp.StartPage), width=30)
+        self.return_btn.pack(side="top", pady=(0, 15))
+
+    def change_language(self, lang: str) -> None:
+        """
+        Set action for the language change button.
+
+        :param lang: A string with the localization language of the application, "en" or "ru"
+        :type lang: class: `str`
+        """
+        if lang == 'ru':
+            self._ = translation.gettext
+        else:
+            self._ = lambda s: s
+
+        self.master.title(self._("Tic-Tac-Toe"))
+        self.label1.config(text=self._("Leaderboard"))
+        self.prev_btn.config(text=self._("Previous"))
+        self.next_btn.config(text=self._("Next"))
+        self.return_btn.config(text=self._("Return to start page"))
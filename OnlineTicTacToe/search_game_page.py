@@ -9,6 +9,7 @@ import threading
 import gettext
 from typing import Callable, Dict
 import requests
+import socketio
 import OnlineTicTacToe.setting_page as setp
 import OnlineTicTacToe.game_page as gp
 
@@ -109,6 +110,7 @@ class SearchGamePage(tk.Frame):
         self.master.cur_page = 'Search'
 
         self.reset: bool = False
+        self.found: bool = False
 
         self.configure(height=320, width=450)
         self.pack_propagate(False)
@@ -125,28 +127,59 @@ class SearchGamePage(tk.Frame):
 
         self._create_widgets()
 
+        self.sio: socketio.Client = socketio.Client()
+        self.master.sio = self.sio
+        self.sio.on('match_found', self.on_match_found, namespace='/search')
+
         self.thread: threading.Thread = threading.Thread(target=self.is_searched, daemon=True)
         self.thread.start()
 
+    def subscribe(self) -> bool:
+        """
+        Subscribe to the server_dir notification about the found game.
+
+        :return: True if the subscription succeeded, otherwise False
+        :rtype: class: `bool`
+        """
+        try:
+            self.sio.connect('https://tictactoegame.serveo.net', namespaces=['/search'],
+                             headers={'Cookie': f"token={self.master.token.get('token')}"}, transports=['websocket'])
+        except socketio.exceptions.ConnectionError:
+            return False
+
+        return True
+
+    def on_match_found(self, data: Dict[str, str]) -> None:
+        """
+        Take the found game pushed by the server_dir.
+
+        :param data: Dictionary with game data
+        :type data: class: `dict[str, str]`
+        """
+        self.after(0, lambda: self.game_ready({'message': 'Success', 'opponent': data['opponent'],
+                                               'game_id': data['game_id']}))
+
     def is_searched(self) -> None:
-        """Ask the server_dir in a separate thread every 5 seconds if the game has been found."""
-        flag = True
+        """
+        Wait in a separate thread until the game has been found.
 
-        while flag:
-            if self.reset:
-                break
+        The server_dir pushes the found game over the socket, so it is asked if the game has been found every 30 seconds
+        only as a fallback. If the subscription failed, the server_dir is long-polled instead: each request is held
+        on the server_dir until the game is found or 25 seconds pass.
+        """
+        subscribed = self.subscribe()
 
+        while not (self.reset or self.found):
             url = 'https://tictactoegame.serveo.net/is_game_searched'
-            response = requests.get(url, cookies=self.master.token)
-
-            if response.json()['message'] == 'Game is not searched yet':
-                time.sleep(5)
-                continue
+            response = requests.get(url, params={'wait': 0 if subscribed else 25}, cookies=self.master.token)
 
             if response.json()['message'] == 'Success':
-                flag = False
                 self.after(0, lambda: self.game_ready({'message': 'Success', 'opponent': response.json()['opponent'],
                                                        'game_id': response.json()['game_id']}))
+                break
+
+            if subscribed:
+                time.sleep(30)
 
     def game_ready(self, data: Dict[str, str]) -> None:
         """
@@ -155,6 +188,12 @@ class SearchGamePage(tk.Frame):
         :param data: Dictionary with game data
         :type data: class: `dict[str, str]`
         """
+        if self.found or self.reset:
+            return
+
+        self.found = True
+        self.sio.disconnect()
+
         if not self.master.mute_flag:
             self.master.background_music.set_volume(0)
         self.master.find_music.play()
@@ -163,13 +202,14 @@ class SearchGamePage(tk.Frame):
 
         self.master.game_id = data['game_id']
 
-        self.after(2600, lambda: self.master.switch_frame(gp.FriendGame))
+        self.master.switch_frame(gp.FriendGame)
 
     def reset_search(self) -> None:
         """Set action for the "Reset search" button."""
         url = 'https://tictactoegame.serveo.net/reset_search'
         requests.get(url, cookies=self.master.token)
         self.reset = True
+        self.sio.disconnect()
         self.master.switch_frame(setp.FriendStartPage)
 
     def _create_widgets(self) -> None:
@@ -15,6 +15,7 @@ import requests
 import OnlineTicTacToe.start_page as stp
 import OnlineTicTacToe.game_page as gap
 import OnlineTicTacToe.search_game_page as sgp
+import OnlineTicTacToe.watch_page as wp
 
 
 translation = gettext.translation('tictactoe',
@@ -35,7 +36,7 @@ class BaseStartPage(tk.Frame):
         """Make constructor method."""
         super().__init__(master)
 
-        self.configure(height=280, width=800)
+        self.configure(height=320, width=800)
         self.pack_propagate(False)
 
         if not self.master.lang_flag:
@@ -51,6 +52,7 @@ class BaseStartPage(tk.Frame):
         self.statistics4: tk.Label = tk.Label()
         self.button1: tk.Button = tk.Button()
         self.button2: tk.Button = tk.Button()
+        self.button3: tk.Button = tk.Button()
         self.step_choice: tk.LabelFrame = tk.LabelFrame()
         self.step_choice1: tk.Radiobutton = tk.Radiobutton()
         self.step_choice2: tk.Radiobutton = tk.Radiobutton()
@@ -239,6 +241,10 @@ class FriendStartPage(BaseStartPage):
                                  command=self.search_game, width=30)
         self.button1.pack(side="top", pady=(0, 5))
 
+        self.button3 = tk.Button(frame, bg="white", font=self.master.btn_font, text=self._("Watch a game"),
+                                 command=lambda: self.master.switch_frame(wp.WatchListPage), width=30)
+        self.button3.pack(side="top", pady=(0, 5))
+
         self.button2 = tk.Button(frame, bg="white", font=self.master.btn_font, text=self._("Return to start page"),
                                  command=lambda: self.master.switch_frame(stp.StartPage), width=30)
         self.button2.pack(side="top")
@@ -269,6 +275,7 @@ class FriendStartPage(BaseStartPage):
                                                                                       "Player2_win"]))
         self.statistics4.config(text=self._("Number of draws - {}").format(self.master.friend_stat["drawn_game"]))
         self.button1.config(text=self._("Search the game"))
+        self.button3.config(text=self._("Watch a game"))
         self.button2.config(text=self._("Return to start page"))
         self.step_choice.config(text=self._(" Choosing a move "))
         self.step_choice1.config(text=self._('Randomly'))
@@ -8,6 +8,7 @@ from typing import Callable
 import requests
 import OnlineTicTacToe.setting_page as setp
 import OnlineTicTacToe.authentification_page as ap
+import OnlineTicTacToe.leaderboard_page as lp
 
 
 translation = gettext.translation('tictactoe',
@@ -40,6 +41,7 @@ class StartPage(tk.Frame):
         self.button1: tk.Button = tk.Button()
         self.button2: tk.Button = tk.Button()
         self.button3: tk.Button = tk.Button()
+        self.button4: tk.Button = tk.Button()
 
         self._create_widgets()
 
@@ -53,12 +55,16 @@ class StartPage(tk.Frame):
 
         self.button1 = tk.Button(self, bg="white", font=self.master.btn_font, text=self._("Online game"), width=30,
                                  command=lambda: self.master.switch_frame(setp.FriendStartPage))
-        self.button1.pack(side="top", pady=(40, 5))
+        self.button1.pack(side="top", pady=(25, 5))
 
         self.button2 = tk.Button(self, bg="white", font=self.master.btn_font, text=self._("Play with the computer"),
                                  width=30, command=lambda: self.master.switch_frame(setp.PcStartPage))
         self.button2.pack(side="top", pady=(0, 5))
 
+        self.button4 = tk.Button(self, bg="white", font=self.master.btn_font, text=self._("Leaderboard"), width=30,
+                                 command=lambda: self.master.switch_frame(lp.LeaderboardPage))
+        self.button4.pack(side="top", pady=(0, 5))
+
         self.button3 = tk.Button(self, bg="white", font=self.master.btn_font, text=self._("Log Out"), width=30,
                                  command=self._logout)
         self.button3.pack(side='top')
@@ -96,4 +102,5 @@ class StartPage(tk.Frame):
         self.label.config(text=self._('Player is {user}').format(user=self.master.user))
         self.button1.config(text=self._("Online game"))
         self.button2.config(text=self._("Play with the computer"))
+        self.button4.config(text=self._("Leaderboard"))
         self.button3.config(text=self._("Log Out"))
@@ -22,6 +22,8 @@ import OnlineTicTacToe.start_page as stp
 import OnlineTicTacToe.setting_page as setp
 import OnlineTicTacToe.search_game_page as sgp
 import OnlineTicTacToe.game_page as gap
+import OnlineTicTacToe.watch_page as wp
+import OnlineTicTacToe.leaderboard_page as lp
 
 
 translation = gettext.translation('tictactoe',
@@ -44,7 +46,7 @@ class App(tk.Tk):
 
         self._frame: Union[None, stp.StartPage, setp.FriendStartPage,
                            setp.PcStartPage, gap.FriendGame, gap.PcGame,
-                           sgp.SearchGamePage] = None
+                           sgp.SearchGamePage, wp.WatchListPage, wp.WatchGame, lp.LeaderboardPage] = None
 
         self.font: tkfont.Font = tkfont.Font(size=14, weight="bold", slant="italic")
         self.btn_font: tkfont.Font = tkfont.Font(size=12, weight="normal", slant="italic")
@@ -118,6 +120,7 @@ class App(tk.Tk):
 
             self.remember_login: bool = True
             self.user: str = _response.json()['user']
+            self.user_id = _response.json()['user_id']
             self.pc_stat['drawn_game'] = _response.json()['pc_stat']['drawn_game']
             self.pc_stat['Player_win'] = _response.json()['pc_stat']['Player_win']
             self.pc_stat['Computer_win'] = _response.json()['pc_stat']['Computer_win']
@@ -188,7 +191,8 @@ class App(tk.Tk):
             self.move.set(-1)
 
         new_frame: Union[stp.StartPage, setp.FriendStartPage, sgp.SearchGamePage,
-                         setp.PcStartPage, gap.FriendGame, gap.PcGame] = frame_class(self)
+                         setp.PcStartPage, gap.FriendGame, gap.PcGame, wp.WatchListPage,
+                         wp.WatchGame, lp.LeaderboardPage] = frame_class(self)
 
         if self._frame is not None:
             self._frame.destroy()
@@ -232,26 +236,16 @@ def main() -> None:
     if app.cur_page == 'Game_page_pc' and app.now_game:
         app.pc_stat["Computer_win"] += 1
 
-        url = 'https://tictactoegame.serveo.net/update_computer_statistic'
+        url = 'https://tictactoegame.serveo.net/record_result'
         headers = {'Content-Type': 'application/json'}
-        data = {'games_played': app.pc_stat["Player_win"] + app.pc_stat["Computer_win"] + app.pc_stat["drawn_game"],
-                'games_won': app.pc_stat['Player_win'],
-                'games_draws': app.pc_stat['drawn_game'], 'games_defeat': app.pc_stat['Computer_win']}
-        requests.post(url, headers=headers, data=json.dumps(data), cookies=app.token)
+        requests.post(url, headers=headers, data=json.dumps({'outcome': 'defeat'}), cookies=app.token)
     elif app.cur_page == 'Game_page_fr' and app.now_game:
         app.friend_stat["Player2_win"] += 1
 
-        url = 'https://tictactoegame.serveo.net/update_friend_statistic'
-        headers = {'Content-Type': 'application/json'}
-        data = {'games_played': app.friend_stat["Player1_win"] + app.friend_stat["Player2_win"] +
-                app.friend_stat["drawn_game"],
-                'games_won': app.friend_stat['Player1_win'],
-                'games_draws': app.friend_stat['drawn_game'],
-                'games_defeat': app.friend_stat['Player2_win']}
-        requests.post(url, headers=headers, data=json.dumps(data), cookies=app.token)
-
         app.sio.emit('reset_game', data={'game_id': app.game_id, 'user_id': app.user_id,
                                          'opponent_id': app.opponent_id})
+    elif app.cur_page == 'Watch_game':
+        app.sio.disconnect()
 
     if not app.remember_login and app.token is not None:
         url = 'https://tictactoegame.serveo.net/logout'
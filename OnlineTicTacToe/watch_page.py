@@ -0,0 +1,300 @@
+"""A module with a page class of the list of live online games and a page class for watching an online game."""
+
+import tkinter as tk
+import os
+import sys
+import gettext
+from typing import Callable, Dict, List, Optional, Union
+import requests
+import socketio
+import OnlineTicTacToe.setting_page as setp
+
+
+translation = gettext.translation('tictactoe',
+                                  os.path.join(getattr(sys, '_MEIPASS', os.path.dirname(os.path.abspath(__file__))),
+                                               'locale'),
+                                  fallback=True)
+
+
+class WatchListPage(tk.Frame):
+    """
+    The class of the page with the list of live online games.
+
+    :param master: An instance of the main class of the game application
+    :type master: class: `tictactoe.App`
+    """
+
+    def __init__(self, master) -> None:
+        """Make constructor method."""
+        super().__init__(master)
+
+        self.master.cur_page = 'Watch_list'
+
+        self.configure(height=650, width=550)
+        self.pack_propagate(False)
+
+        if not self.master.lang_flag:
+            self._: Callable = lambda s: s
+        else:
+            self._: Callable = translation.gettext
+
+        self.games: List[Dict[str, Union[str, int, List[str]]]] = []
+
+        self.label1: tk.Label = tk.Label()
+        self.list_frame: tk.Frame = tk.Frame()
+        self.empty_label: tk.Label = tk.Label()
+        self.refresh_btn: tk.Button = tk.Button()
+        self.return_btn: tk.Button = tk.Button()
+
+        self._create_widgets()
+        self.refresh()
+
+    def refresh(self) -> None:
+        """Set action for the "Refresh" button, which loads the list of live games from the server_dir."""
+        url = 'https://tictactoegame.serveo.net/live_games'
+        self.games = requests.get(url, cookies=self.master.token).json()['games']
+
+        for widget in self.list_frame.winfo_children():
+            widget.destroy()
+
+        for game in self.games:
+            tk.Button(self.list_frame, bg="white", font=self.master.btn_font, width=40,
+                      text=f"{game['players'][0]} ({game['signs'][0]}) - {game['players'][1]} ({game['signs'][1]})"
+                           f"   👁 {game['spectators']}",
+                      command=lambda game_id=game['game_id']: self.watch(game_id)).pack(side="top", pady=2)
+
+        self.empty_label = tk.Label(self.list_frame, font=self.master.btn_font,
+                                    text='' if self.games else self._("There are no games to watch now"))
+        self.empty_label.pack(side="top")
+
+    def watch(self, game_id: str) -> None:
+        """
+        Set action for the button of a game, which opens the page for watching the game.
+
+        :param game_id: Id of the game
+        :type game_id: class: `str`
+        """
+        self.master.game_id = game_id
+        self.master.switch_frame(WatchGame)
+
+    def _create_widgets(self) -> None:
+        """Render widgets of the page with the list of live games."""
+        self.label1 = tk.Label(self, font=self.master.font, text=self._("Live games"))
+        self.label1.pack(side="top", pady=(15, 15))
+
+        self.list_frame = tk.Frame(self)
+        self.list_frame.pack(side="top", fill="both", expand=True)
+
+        self.refresh_btn = tk.Button(self, bg="white", font=self.master.btn_font, text=self._("Refresh"),
+                                     command=self.refresh, width=30)
+        self.refresh_btn.pack(side="top", pady=(0, 5))
+
+        self.return_btn = tk.Button(self, bg="white", font=self.master.btn_font,
+                                    text=self._("Return to online game page"),
+                                    command=lambda: self.master.switch_frame(setp.FriendStartPage), width=30)
+        self.return_btn.pack(side="top", pady=(0, 15))
+
+    def change_language(self, lang: str) -> None:
+        """
+        Set action for the language change button.
+
+        :param lang: A string with the localization language of the application, "en" or "ru"
+        :type lang: class: `str`
+        """
+        if lang == 'ru':
+            self._ = translation.gettext
+        else:
+            self._ = lambda s: s
+
+        self.master.title(self._("Tic-Tac-Toe"))
+        self.label1.config(text=self._("Live games"))
+        self.refresh_btn.config(text=self._("Refresh"))
+        self.return_btn.config(text=self._("Return to online game page"))
+        if not self.games:
+            self.empty_label.config(text=self._("There are no games to watch now"))
+
+
+class WatchGame(tk.Frame):
+    """
+    The page class for watching an online game.
+
+    The page connects to the "/watch" namespace of the server_dir, gets the snapshot of the game
+    and then the moves of the players in the compact protocol.
+
+    :param master: An instance of the main class of the game application
+    :type master: class: `tictactoe.App`
+    """
+
+    def __init__(self, master) -> None:
+        """Make constructor method."""
+        super().__init__(master)
+
+        self.master.cur_page = 'Watch_game'
+
+        self.configure(height=650, width=550)
+        self.pack_propagate(False)
+
+        if not self.master.lang_flag:
+            self._: Callable = lambda s: s
+        else:
+            self._: Callable = translation.gettext
+
+        self.players: List[str] = ['', '']
+        self.signs: str = 'XO'
+        self.moves: int = 0
+        self.winner: Optional[int] = None
+        self.left: Optional[int] = None
+        self.over: bool = False
+
+        self._color: Dict[str, str] = {"X": "red", "O": "blue"}
+        self._players_lbl: tk.Label = tk.Label()
+        self._status: tk.Label = tk.Label()
+        self._field: List[tk.Button] = []
+        self._return_btn: tk.Button = tk.Button()
+
+        self._create_widgets()
+
+        self.sio: socketio.Client = socketio.Client()
+        self.master.sio = self.sio
+        self.sio.on('snapshot', lambda data: self.after(0, lambda: self.on_snapshot(data)), namespace='/watch')
+        self.sio.on('update_board', lambda data: self.after(0, lambda: self.on_update_board(data)),
+                    namespace='/watch')
+        self.sio.on('update_game_over', lambda data: self.after(0, lambda: self.on_update_game_over(data)),
+                    namespace='/watch')
+        self.sio.on('player_left', lambda data: self.after(0, lambda: self.on_player_left(data)), namespace='/watch')
+        try:
+            self.sio.connect(f'https://tictactoegame.serveo.net?game_id={self.master.game_id}',
+                             namespaces=['/watch'], transports=['websocket'])
+        except socketio.exceptions.ConnectionError:
+            self.over = True
+            self._update_status()
+
+    def on_snapshot(self, data: Dict[str, Union[str, bytes, bool, int, List[str], None]]) -> None:
+        """
+        Draw the game as it is when the spectator joins it.
+
+        :param data: Dictionary with the players, their signs, the moves made in the game one byte per move,
+                     whether the game is over and the number of the winner
+        :type data: class: `dict[str, str | bytes | bool | int | list[str] | None]`
+        """
+        self.players = data['players']
+        self.signs = data['signs']
+        self._players_lbl.config(text=f"{self.players[0]}:  {self.signs[0]}       "
+                                      f"{self.players[1]}:  {self.signs[1]}")
+
+        for square in data['moves']:
+            self._draw_move(square)
+
+        self.over = data['over']
+        self.winner = data['winner']
+        self._update_status()
+
+    def on_update_board(self, data: bytes) -> None:
+        """
+        Draw a move of a player.
+
+        :param data: Move with the move number in the upper and the square in the lower 4 bits
+        :type data: class: `bytes`
+        """
+        if data[0] >> 4 == self.moves:
+            self._draw_move(data[0] & 0xF)
+        self._update_status()
+
+    def on_update_game_over(self, data: bytes) -> None:
+        """
+        Draw the last move and the result of the game.
+
+        :param data: Last move, then 0 for a draw or the number of the winner plus 1, then the winning line
+        :type data: class: `bytes`
+        """
+        if data[0] >> 4 == self.moves:
+            self._draw_move(data[0] & 0xF)
+
+        self.over = True
+        if data[1] != 0:
+            self.winner = data[1] - 1
+            for square in data[2:5]:
+                self._field[square]["background"] = "#90EE90"
+        else:
+            for elem in self._field:
+                elem["background"] = "#F0E68C"
+        self._update_status()
+
+    def on_player_left(self, data: bytes) -> None:
+        """
+        Show that a player left the game.
+
+        :param data: Number of the player who left the game
+        :type data: class: `bytes`
+        """
+        self.over = True
+        self.left = data[0]
+        self.winner = 1 - data[0]
+        self._update_status()
+
+    def _draw_move(self, square: int) -> None:
+        """
+        Draw the sign of the player who makes the next move in the square.
+
+        :param square: The position of the move
+        :type square: class: `int`
+        """
+        sign = self.signs[self.moves % 2]
+        self._field[square]["text"] = sign
+        self._field[square]["disabledforeground"] = self._color[sign]
+        self.moves += 1
+
+    def _update_status(self) -> None:
+        """Change the text of the label with the status of the game."""
+        if self.left is not None:
+            text = self._("{player} reset the game").format(player=self.players[self.left])
+        elif self.over and self.winner is not None:
+            text = self._("{player} win").format(player=self.players[self.winner])
+        elif self.over and self.moves == 9:
+            text = self._("It is a draw")
+        elif self.over:
+            text = self._("The game is over")
+        else:
+            text = self._("{player} turn").format(player=self.players[self.moves % 2])
+        self._status.config(text=text)
+
+    def _return(self) -> None:
+        """Set action for the "Return to the list of games" button."""
+        self.sio.disconnect()
+        self.master.switch_frame(WatchListPage)
+
+    def _create_widgets(self) -> None:
+        """Render widgets of the page for watching a game."""
+        self._players_lbl = tk.Label(self, font=self.master.font, text='')
+        self._players_lbl.pack(side="top", anchor="n", pady=(10, 15))
+
+        frame = tk.Frame(self)
+        frame.pack(side="top")
+        for i in range(9):
+            button = tk.Button(frame, text=' ', width=3, height=2, font=('Verdana', 45, 'bold'),
+                               background='white', state="disabled")
+            button.grid(row=i // 3, column=i % 3, sticky='nsew')
+            self._field.append(button)
+
+        self._status = tk.Label(self, bg="white", font=self.master.font, text='', width=36, height=2)
+        self._status.pack(side="top", pady=15)
+
+        self._return_btn = tk.Button(self, bg="white", font=self.master.btn_font,
+                                     text=self._("Return to the list of games"), command=self._return, width=30)
+        self._return_btn.pack(side="top", pady=(0, 15))
+
+    def change_language(self, lang: str) -> None:
+        """
+        Set action for the language change button.
+
+        :param lang: A string with the localization language of the application, "en" or "ru"
+        :type lang: class: `str`
+        """
+        if lang == 'ru':
+            self._ = translation.gettext
+        else:
+            self._ = lambda s: s
+
+        self.master.title(self._("Tic-Tac-Toe"))
+        self._return_btn.config(text=self._("Return to the list of games"))
+        self._update_status()
@@ -165,7 +165,12 @@ def task_style_flake() -> Dict[str, Any]:
         'actions': ['flake8 OnlineTicTacToe/authentification_page.py', 'flake8 OnlineTicTacToe/game_page.py',
                     'flake8 OnlineTicTacToe/search_game_page.py', 'flake8 OnlineTicTacToe/setting_page.py',
                     'flake8 OnlineTicTacToe/start_page.py', 'flake8 OnlineTicTacToe/tictactoe.py',
-                    'flake8 server_dir/server.py', 'flake8 dodo.py', 'flake8 setup/setup.py',
+                    'flake8 OnlineTicTacToe/watch_page.py', 'flake8 OnlineTicTacToe/leaderboard_page.py',
+                    'flake8 server_dir/server.py', 'flake8 server_dir/state_store.py',
+                    'flake8 server_dir/matchmaking.py', 'flake8 server_dir/game_record.py',
+                    'flake8 server_dir/sweeper.py', 'flake8 server_dir/batch_writers.py', 'flake8 server_dir/caches.py',
+                    'flake8 server_dir/matchmaking_bench.py', 'flake8 server_dir/test_server.py',
+                    'flake8 dodo.py', 'flake8 setup/setup.py',
                     'flake8 OnlineTicTacToe/__main__.py']
     }
 
@@ -181,7 +186,12 @@ def task_style_pylint() -> Dict[str, Any]:
         'actions': ['pylint OnlineTicTacToe/authentification_page.py', 'pylint OnlineTicTacToe/game_page.py',
                     'pylint OnlineTicTacToe/search_game_page.py', 'pylint OnlineTicTacToe/setting_page.py',
                     'pylint OnlineTicTacToe/start_page.py', 'pylint OnlineTicTacToe/tictactoe.py',
-                    'pylint server_dir/server.py', 'pylint dodo.py', 'pylint setup/setup.py',
+                    'pylint OnlineTicTacToe/watch_page.py', 'pylint OnlineTicTacToe/leaderboard_page.py',
+                    'pylint server_dir/server.py', 'pylint server_dir/state_store.py',
+                    'pylint server_dir/matchmaking.py', 'pylint server_dir/game_record.py',
+                    'pylint server_dir/sweeper.py', 'pylint server_dir/batch_writers.py', 'pylint server_dir/caches.py',
+                    'pylint server_dir/matchmaking_bench.py', 'pylint server_dir/test_server.py',
+                    'pylint dodo.py', 'pylint setup/setup.py',
                     'pylint OnlineTicTacToe/__main__.py']
     }
 
@@ -197,11 +207,29 @@ def task_docstyle() -> Dict[str, Any]:
         'actions': ['pydocstyle OnlineTicTacToe/authentification_page.py', 'pydocstyle OnlineTicTacToe/game_page.py',
                     'pydocstyle OnlineTicTacToe/search_game_page.py', 'pydocstyle OnlineTicTacToe/setting_page.py',
                     'pydocstyle OnlineTicTacToe/start_page.py', 'pydocstyle OnlineTicTacToe/tictactoe.py',
-                    'pydocstyle server_dir/server.py', 'pydocstyle dodo.py', 'pydocstyle setup/setup.py',
+                    'pydocstyle OnlineTicTacToe/watch_page.py', 'pydocstyle OnlineTicTacToe/leaderboard_page.py',
+                    'pydocstyle server_dir/server.py', 'pydocstyle server_dir/state_store.py',
+                    'pydocstyle server_dir/matchmaking.py', 'pydocstyle server_dir/game_record.py',
+                    'pydocstyle server_dir/sweeper.py', 'pydocstyle server_dir/batch_writers.py',
+                    'pydocstyle server_dir/caches.py',
+                    'pydocstyle server_dir/matchmaking_bench.py', 'pydocstyle server_dir/test_server.py',
+                    'pydocstyle dodo.py', 'pydocstyle setup/setup.py',
                     'pydocstyle OnlineTicTacToe/__main__.py']
     }
 
 
+def task_test() -> Dict[str, Any]:
+    """
+    Run the tests of the server.
+
+    :return: managing dictionary
+    :rtype: class `Dict[str, Any]`
+    """
+    return {
+        'actions': ['pytest server_dir'],
+    }
+
+
 def task_check() -> Dict[str, Any]:
     """
     Perform all checks.
@@ -211,7 +239,7 @@ def task_check() -> Dict[str, Any]:
     """
     return {
         'actions': None,
-        'task_dep': ['style_flake', 'style_pylint', 'docstyle']
+        'task_dep': ['style_flake', 'style_pylint', 'docstyle', 'test']
     }
 
 
@@ -238,6 +266,12 @@ def task_run_server() -> Dict[str, Any]:
     return {
         'actions': ['sudo docker compose -f server_dir/docker-compose.yml up -d'],
         'file_dep': ['server_dir/server.py',
+                     'server_dir/state_store.py',
+                     'server_dir/matchmaking.py',
+                     'server_dir/game_record.py',
+                     'server_dir/sweeper.py',
+                     'server_dir/batch_writers.py',
+                     'server_dir/caches.py',
                      'server_dir/run_server.sh',
                      'server_dir/Pipfile',
                      'server_dir/Dockerfile',
@@ -0,0 +1,240 @@
+"""Buffers collecting the writes of finished games and of statistics to do them in batches."""
+
+import time
+import itertools
+from collections import deque
+from typing import Callable, Dict, List, Tuple, Union
+from gevent.event import Event
+from sqlalchemy.exc import SQLAlchemyError
+
+
+class HistoryWriter:
+    """
+    Write-behind queue of the finished games waiting to be written to the database.
+
+    Request handlers only put the finished games into the queue, and the writer greenlet takes them out
+    in batches and writes each batch with one transaction. The queue is bounded: when it is full,
+    new games are dropped and counted instead of making the handlers wait for the database.
+    A batch the database fails to write is counted as failed and is not written again.
+
+    :param capacity: Maximal number of games in the queue
+    :type capacity: class: `int`
+    :param batch_size: Maximal number of games written in one transaction, the writer is woken when so many are queued
+    :type batch_size: class: `int`
+    :param write: Function writing a batch of games, each one as a row of the game and the rows of its moves
+    :type write: class: `Callable[[list[tuple[dict, list[dict]]]], None]`
+    :param clock: Function returning the current time, defaults to `time.time`
+    :type clock: class: `Callable[[], float]`
+    """
+
+    def __init__(self, capacity: int, batch_size: int, write: Callable[[List[Tuple[Dict, List[Dict]]]], None],
+                 clock: Callable[[], float] = time.time) -> None:
+        """Make constructor method."""
+        self.capacity: int = capacity
+        self.batch_size: int = batch_size
+        self.write: Callable[[List[Tuple[Dict, List[Dict]]]], None] = write
+        self.clock: Callable[[], float] = clock
+        self.full: Event = Event()
+        self._queue: deque = deque()
+        self._counters: Dict[str, Union[int, float]] = {'written': 0, 'moves_written': 0, 'dropped': 0, 'failed': 0,
+                                                        'batches': 0, 'high_water': 0, 'flush_seconds_max': 0.0,
+                                                        'flush_seconds_last': 0.0, 'lag_seconds_max': 0.0,
+                                                        'lag_seconds_last': 0.0}
+
+    def __len__(self) -> int:
+        """
+        Get the number of games in the queue.
+
+        :return: Number of games
+        :rtype: class: `int`
+        """
+        return len(self._queue)
+
+    def push(self, game: Dict, moves: List[Dict]) -> bool:
+        """
+        Put a finished game into the queue without waiting.
+
+        :param game: Row of the game
+        :type game: class: `dict`
+        :param moves: Rows of the moves of the game
+        :type moves: class: `list[dict]`
+        :return: False if the queue is full and the game is dropped, otherwise True
+        :rtype: class: `bool`
+        """
+        if len(self._queue) >= self.capacity:
+            self._counters['dropped'] += 1
+            return False
+
+        self._queue.append((self.clock(), game, moves))
+        self._counters['high_water'] = max(self._counters['high_water'], len(self._queue))
+        if len(self._queue) >= self.batch_size:
+            self.full.set()
+        return True
+
+    def flush(self) -> int:
+        """
+        Write one batch of the queued games.
+
+        :return: Number of games taken from the queue
+        :rtype: class: `int`
+        """
+        batch = [self._queue.popleft() for _ in range(min(self.batch_size, len(self._queue)))]
+        if len(self._queue) < self.batch_size:
+            self.full.clear()
+        if not batch:
+            return 0
+
+        started = self.clock()
+        try:
+            self.write([(game, moves) for _, game, moves in batch])
+        except SQLAlchemyError:
+            self._counters['failed'] += len(batch)
+            return len(batch)
+        finished = self.clock()
+
+        self._counters['written'] += len(batch)
+        self._counters['moves_written'] += sum(len(moves) for _, _, moves in batch)
+        self._counters['batches'] += 1
+        self._counters['flush_seconds_last'] = finished - started
+        self._counters['flush_seconds_max'] = max(self._counters['flush_seconds_max'], finished - started)
+        self._counters['lag_seconds_last'] = finished - batch[0][0]
+        self._counters['lag_seconds_max'] = max(self._counters['lag_seconds_max'], finished - batch[0][0])
+        return len(batch)
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """
+        Get the statistics of the queue.
+
+        The lag is the time from putting the oldest game of a batch into the queue until the batch is written.
+
+        :return: Dictionary with the numbers of queued, written, dropped and failed games, the number of batches,
+                 the maximal queue length and the flush times and lags in seconds
+        :rtype: class: `dict[str, int | float]`
+        """
+        return {**self._counters, 'queued': len(self._queue), 'capacity': self.capacity}
+
+
+class StatsBuffer:
+    """
+    Buffer of the changes of the statistics waiting to be written to the database.
+
+    The results of games only add up the changes of the statistics of each user in memory, and the flusher greenlet
+    writes the changes of many users with one transaction, so one row is updated once per flush however many games
+    its user finished. A flush writes the changes of at most `limit` users, the oldest first. The changes are kept
+    until their transaction is committed and are added to the statistics read by `load_profile`,
+    so users see their results before they are written. The changes of a failed flush are put back.
+
+    :param limit: Maximal number of statistics rows written in one flush
+    :type limit: class: `int`
+    :param write: Function writing a batch of changes, each one as a statistics class, an id of user and the changes
+    :type write: class: `Callable[[list[tuple[type, str, dict[str, float]]]], None]`
+    :param clock: Function returning the current time, defaults to `time.time`
+    :type clock: class: `Callable[[], float]`
+    """
+
+    def __init__(self, limit: int, write: Callable[[List[Tuple[type, str, Dict[str, float]]]], None],
+                 clock: Callable[[], float] = time.time) -> None:
+        """Make constructor method."""
+        self.limit: int = limit
+        self.write: Callable[[List[Tuple[type, str, Dict[str, float]]]], None] = write
+        self.clock: Callable[[], float] = clock
+        self._pending: Dict[Tuple[type, str], Dict[str, float]] = {}
+        self._flushing: Dict[Tuple[type, str], Dict[str, float]] = {}
+        self._counters: Dict[str, Union[int, float]] = {'results': 0, 'rows_written': 0, 'flushes': 0, 'failed': 0,
+                                                        'flush_seconds_max': 0.0, 'flush_seconds_last': 0.0}
+
+    def __len__(self) -> int:
+        """
+        Get the number of statistics rows with changes waiting to be written.
+
+        :return: Number of rows
+        :rtype: class: `int`
+        """
+        return len(self._pending)
+
+    def add(self, model: type, user_id: str, deltas: Dict[str, float]) -> None:
+        """
+        Add changes to the statistics of the user.
+
+        :param model: Statistics class
+        :type model: class: `type`
+        :param user_id: Id of user
+        :type user_id: class: `str`
+        :param deltas: Changes of the columns
+        :type deltas: class: `dict[str, float]`
+        """
+        pending = self._pending.setdefault((model, user_id), {})
+        for column, delta in deltas.items():
+            pending[column] = pending.get(column, 0) + delta
+        self._counters['results'] += 1
+
+    def pending(self, model: type, user_id: str) -> Dict[str, float]:
+        """
+        Get the changes of the statistics of the user that are not committed yet.
+
+        :param model: Statistics class
+        :type model: class: `type`
+        :param user_id: Id of user
+        :type user_id: class: `str`
+        :return: Changes of the columns
+        :rtype: class: `dict[str, float]`
+        """
+        pending = dict(self._flushing.get((model, user_id), {}))
+        for column, delta in self._pending.get((model, user_id), {}).items():
+            pending[column] = pending.get(column, 0) + delta
+        return pending
+
+    def users(self, model: type) -> List[str]:
+        """
+        Get the ids of the users whose statistics have changes that are not committed yet.
+
+        :param model: Statistics class
+        :type model: class: `type`
+        :return: List of ids of users
+        :rtype: class: `list[str]`
+        """
+        return list({user_id for row_model, user_id in itertools.chain(self._flushing, self._pending)
+                     if row_model is model})
+
+    def flush(self) -> int:
+        """
+        Write the oldest changes to the database with one transaction.
+
+        :return: Number of statistics rows taken from the buffer
+        :rtype: class: `int`
+        """
+        for key in itertools.islice(list(self._pending), self.limit):
+            self._flushing[key] = self._pending.pop(key)
+        if not self._flushing:
+            return 0
+
+        started = self.clock()
+        try:
+            self.write([(model, user_id, deltas) for (model, user_id), deltas in self._flushing.items()])
+        except SQLAlchemyError:
+            self._counters['failed'] += 1
+            for key, deltas in self._pending.items():
+                merged = self._flushing.setdefault(key, {})
+                for column, delta in deltas.items():
+                    merged[column] = merged.get(column, 0) + delta
+            self._pending, self._flushing = self._flushing, {}
+            return 0
+        finished = self.clock()
+
+        rows = len(self._flushing)
+        self._flushing = {}
+        self._counters['rows_written'] += rows
+        self._counters['flushes'] += 1
+        self._counters['flush_seconds_last'] = finished - started
+        self._counters['flush_seconds_max'] = max(self._counters['flush_seconds_max'], finished - started)
+        return rows
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """
+        Get the statistics of the buffer.
+
+        :return: Dictionary with the numbers of recorded results, written rows, flushes and failed flushes,
+                 the number of rows waiting and the flush times in seconds
+        :rtype: class: `dict[str, int | float]`
+        """
+        return {**self._counters, 'pending': len(self._pending)}
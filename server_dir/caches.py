@@ -0,0 +1,250 @@
+"""In-memory caches of the profiles of users and of the top of the leaderboard."""
+
+import time
+import bisect
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+
+class ProfileCache:
+    """
+    Least recently used cache of the profiles of users sent to the client.
+
+    A profile is kept until its time to live passes or it is invalidated by a change of the statistics of its user.
+    When the cache is full, the least recently used profile is evicted. With several workers the statistics
+    written by each worker are counted by a version of the profile shared by all of them, and a cached profile
+    is taken only if it was loaded at the current version.
+
+    :param capacity: Maximal number of profiles in the cache
+    :type capacity: class: `int`
+    :param ttl: Number of seconds a profile is kept
+    :type ttl: class: `float`
+    :param clock: Function returning the current time, defaults to `time.time`
+    :type clock: class: `Callable[[], float]`
+    """
+
+    def __init__(self, capacity: int, ttl: float, clock: Callable[[], float] = time.time) -> None:
+        """Make constructor method."""
+        self.capacity: int = capacity
+        self.ttl: float = ttl
+        self.clock: Callable[[], float] = clock
+        self._profiles: 'OrderedDict[str, Tuple[float, Dict, int]]' = OrderedDict()
+        self._counters: Dict[str, int] = {'hits': 0, 'misses': 0, 'evictions': 0, 'expirations': 0,
+                                          'invalidations': 0}
+
+    def get(self, user_id: str, version: int = 0) -> Optional[Dict]:
+        """
+        Get the profile of the user.
+
+        :param user_id: Id of user
+        :type user_id: class: `str`
+        :param version: Shared version of the profile, defaults to 0
+        :type version: class: `int`
+        :return: Profile or None if it is not cached, its time to live has passed or it was loaded at another version
+        :rtype: class: `dict` or None
+        """
+        cached = self._profiles.get(user_id)
+        if cached is not None and cached[0] <= self.clock():
+            del self._profiles[user_id]
+            self._counters['expirations'] += 1
+            cached = None
+        elif cached is not None and cached[2] != version:
+            del self._profiles[user_id]
+            self._counters['invalidations'] += 1
+            cached = None
+
+        if cached is None:
+            self._counters['misses'] += 1
+            return None
+
+        self._profiles.move_to_end(user_id)
+        self._counters['hits'] += 1
+        return cached[1]
+
+    def put(self, user_id: str, profile: Dict, version: int = 0) -> None:
+        """
+        Cache the profile of the user, evicting the least recently used profile if the cache is full.
+
+        :param user_id: Id of user
+        :type user_id: class: `str`
+        :param profile: Profile
+        :type profile: class: `dict`
+        :param version: Shared version of the profile read before the profile was loaded, defaults to 0
+        :type version: class: `int`
+        """
+        self._profiles[user_id] = (self.clock() + self.ttl, profile, version)
+        self._profiles.move_to_end(user_id)
+        while len(self._profiles) > self.capacity:
+            self._profiles.popitem(last=False)
+            self._counters['evictions'] += 1
+
+    def invalidate(self, user_id: str) -> None:
+        """
+        Remove the profile of the user from the cache.
+
+        :param user_id: Id of user
+        :type user_id: class: `str`
+        """
+        if self._profiles.pop(user_id, None) is not None:
+            self._counters['invalidations'] += 1
+
+    def written(self, user_id: str, version: int) -> None:
+        """
+        Take the shared version of the profile after this worker has written the statistics of the user.
+
+        A cached profile loaded at the version before it has all the changes of this worker, since any change
+        invalidates it, so it stays cached. Otherwise another worker has written the statistics in between.
+
+        :param user_id: Id of user
+        :type user_id: class: `str`
+        :param version: Shared version of the profile after the write
+        :type version: class: `int`
+        """
+        cached = self._profiles.get(user_id)
+        if cached is not None and cached[2] == version - 1:
+            self._profiles[user_id] = (*cached[:2], version)
+        else:
+            self.invalidate(user_id)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the statistics of the cache.
+
+        :return: Dictionary with the numbers of hits, misses, evictions, expirations and invalidations,
+                 the number of cached profiles and the capacity
+        :rtype: class: `dict[str, int]`
+        """
+        return {**self._counters, 'size': len(self._profiles), 'capacity': self.capacity}
+
+
+class Leaderboard:
+    """
+    Top of the users by the rating of online games kept in memory.
+
+    The top is kept as a list of ratings and ids sorted in ascending order, so a recorded result moves a user
+    with a binary search instead of sorting the users again. When a user drops out of the full top,
+    it is not known who takes the last place, so the top is marked stale and is loaded again by the next reader.
+
+    With several workers the ratings written by the other workers are counted by a version shared by all of them.
+    The top remembers the version it has seen and is loaded again when the shared version is another one.
+
+    :param size: Number of the users in the top
+    :type size: class: `int`
+    """
+
+    def __init__(self, size: int) -> None:
+        """Make constructor method."""
+        self.size: int = size
+        self.stale: bool = True
+        self.version: int = 0
+        self._entries: List[Tuple[float, str]] = []
+        self._users: Dict[str, Tuple[float, str]] = {}
+
+    def load(self, users: List[Tuple[str, str, float]], version: int = 0) -> None:
+        """
+        Replace the top.
+
+        :param users: List of ids, usernames and ratings of the best users
+        :type users: class: `list[tuple[str, str, float]]`
+        :param version: Shared version of the ratings read before the users were loaded, defaults to 0
+        :type version: class: `int`
+        """
+        self._users = {user_id: (rating, username) for user_id, username, rating in users[:self.size]}
+        self._entries = sorted((rating, user_id) for user_id, (rating, _) in self._users.items())
+        self.stale = False
+        self.version = version
+
+    def current(self, version: int) -> bool:
+        """
+        Tell if the top can be read without loading it again.
+
+        :param version: Shared version of the ratings
+        :type version: class: `int`
+        :return: True if the top is not stale and has seen the version, otherwise False
+        :rtype: class: `bool`
+        """
+        return not self.stale and self.version == version
+
+    def written(self, version: int) -> None:
+        """
+        Take the shared version of the ratings after this worker has written changes the top already has.
+
+        If the top has seen the version before it, no other worker has written ratings in between
+        and the top stays current, otherwise it is loaded again by the next reader.
+
+        :param version: Shared version of the ratings after the write
+        :type version: class: `int`
+        """
+        if version == self.version + 1:
+            self.version = version
+        else:
+            self.stale = True
+
+    def update(self, user_id: str, username: str, rating: float) -> None:
+        """
+        Change the rating of the user in the top.
+
+        :param user_id: Id of user
+        :type user_id: class: `str`
+        :param username: Username of user
+        :type username: class: `str`
+        :param rating: New rating of the user
+        :type rating: class: `float`
+        """
+        if self.stale:
+            return
+
+        full = self.full()
+        old = self._users.pop(user_id, None)
+        if old is not None:
+            del self._entries[bisect.bisect_left(self._entries, (old[0], user_id))]
+
+        if not full or self._entries and (rating, user_id) > self._entries[0]:
+            bisect.insort(self._entries, (rating, user_id))
+            self._users[user_id] = (rating, username)
+            if len(self._entries) > self.size:
+                _, evicted_id = self._entries.pop(0)
+                del self._users[evicted_id]
+        elif old is not None:
+            self.stale = True
+
+    def page(self, after: Optional[str], limit: int) -> Optional[List[Tuple[str, str, float]]]:
+        """
+        Get a page of the top.
+
+        :param after: Id of the user after whom the page starts, or None for the first page
+        :type after: class: `str` or None
+        :param limit: Maximal number of users on the page
+        :type limit: class: `int`
+        :return: List of ids, usernames and ratings of the users, or None if the user after whom the page starts
+                 is not in the top
+        :rtype: class: `list[tuple[str, str, float]]` or None
+        """
+        end = len(self._entries)
+        if after is not None:
+            if after not in self._users:
+                return None
+            end = bisect.bisect_left(self._entries, (self._users[after][0], after))
+
+        return [(user_id, self._users[user_id][1], rating)
+                for rating, user_id in reversed(self._entries[max(end - limit, 0):end])]
+
+    def rating(self, user_id: str) -> Optional[float]:
+        """
+        Get the rating of the user in the top.
+
+        :param user_id: Id of user
+        :type user_id: class: `str`
+        :return: Rating or None if the user is not in the top
+        :rtype: class: `float` or None
+        """
+        return self._users[user_id][0] if user_id in self._users else None
+
+    def full(self) -> bool:
+        """
+        Tell if the top has as many users as its size, so there can be users below it.
+
+        :return: True if the top is full, otherwise False
+        :rtype: class: `bool`
+        """
+        return len(self._entries) >= self.size
@@ -0,0 +1,182 @@
+"""Record of an online game and the encoding of its events for the compact protocol."""
+
+from typing import Dict, Optional, Tuple, Union
+
+
+WIN_LINES: Tuple[Tuple[int, Tuple[int, int, int]], ...] = tuple(
+    ((1 << pos_a) | (1 << pos_b) | (1 << pos_c), (pos_a, pos_b, pos_c))
+    for pos_a, pos_b, pos_c in ((0, 1, 2), (3, 4, 5), (6, 7, 8), (0, 3, 6), (1, 4, 7), (2, 5, 8), (0, 4, 8), (2, 4, 6)))
+
+
+class Game:
+    """
+    Record of an online game.
+
+    Players are stored by their number, 0 for the player who moves first and 1 for the other one.
+    The board keeps the 9-bit masks of the squares taken by the players in its lower and upper 9 bits,
+    the ready mask keeps the players who have ever connected to the game in its two bits,
+    the present mask keeps the players who are connected to it now,
+    and the binary mask keeps the players who have chosen the compact protocol.
+    The history keeps the squares of the moves in the order they were made, one byte per move.
+    Spectators is the number of the connections watching the game.
+    The record has slots instead of a dictionary, so that a worker can hold many games at once.
+
+    :param player_ids: Ids of the players
+    :type player_ids: class: `tuple[str, str]`
+    :param signs: Signs of the players, for example "XO"
+    :type signs: class: `str`
+    :param usernames: Usernames of the players
+    :type usernames: class: `tuple[str, str]`
+    :param created: Time when the game was created
+    :type created: class: `float`
+    """
+
+    __slots__ = ('player_ids', 'signs', 'usernames', 'board', 'moves', 'history', 'ready', 'present', 'binary',
+                 'spectators', 'started', 'over', 'winner', 'created', 'updated')
+
+    def __init__(self, player_ids: Tuple[str, str], signs: str, usernames: Tuple[str, str], created: float) -> None:
+        """Make constructor method."""
+        self.player_ids: Tuple[str, str] = player_ids
+        self.signs: str = signs
+        self.usernames: Tuple[str, str] = usernames
+        self.board: int = 0
+        self.moves: int = 0
+        self.history: bytes = b''
+        self.ready: int = 0
+        self.present: int = 0
+        self.binary: int = 0
+        self.spectators: int = 0
+        self.started: bool = False
+        self.over: bool = False
+        self.winner: Optional[str] = None
+        self.created: float = created
+        self.updated: float = created
+
+    def index(self, user_id: str) -> int:
+        """
+        Get the number of the player in the game.
+
+        :param user_id: Id of user
+        :type user_id: class: `str`
+        :return: 0 for the player who moves first, 1 for the other one
+        :rtype: class: `int`
+        """
+        return 0 if self.player_ids[0] == user_id else 1
+
+    def opponent(self, user_id: str) -> str:
+        """
+        Get the opponent of the user.
+
+        :param user_id: Id of user
+        :type user_id: class: `str`
+        :return: Id of the opponent
+        :rtype: class: `str`
+        """
+        return self.player_ids[1 - self.index(user_id)]
+
+    def play(self, user_id: str, pos: int, now: float) -> Optional[Tuple[int, int, int]]:
+        """
+        Make a move in the game if it is allowed.
+
+        :param user_id: Id of the user who makes the move
+        :type user_id: class: `str`
+        :param pos: Square of the move from 0 to 8
+        :type pos: class: `int`
+        :param now: Time of the move
+        :type now: class: `float`
+        :return: Winning line of the user if the move wins the game, otherwise None
+        :rtype: class: `tuple[int, int, int]` or None
+        :raises ValueError: If the game is not running, it is not the user's turn or the square is taken
+        """
+        number = self.moves % 2
+
+        if not self.started or self.over or self.player_ids[number] != user_id:
+            raise ValueError('Invalid move')
+        if not isinstance(pos, int) or not 0 <= pos < 9 or (self.board | self.board >> 9) >> pos & 1:
+            raise ValueError('Invalid move')
+
+        self.board |= 1 << (pos + 9 * number)
+        self.moves += 1
+        self.history += bytes((pos,))
+        self.updated = now
+
+        line = self.line(number)
+        if line is not None:
+            self.over = True
+            self.winner = user_id
+            return line
+
+        self.over = self.moves == 9
+        return None
+
+    def line(self, number: int) -> Optional[Tuple[int, int, int]]:
+        """
+        Get the winning line of the player.
+
+        :param number: Number of the player
+        :type number: class: `int`
+        :return: Winning line or None if the player has no winning line
+        :rtype: class: `tuple[int, int, int]` or None
+        """
+        board = self.board >> 9 * number & 0x1FF
+        for mask, line in WIN_LINES:
+            if board & mask == mask:
+                return line
+        return None
+
+
+def encode_move(seq: int, pos: int) -> bytes:
+    """
+    Encode a move for the compact protocol.
+
+    :param seq: Number of the moves made before the move
+    :type seq: class: `int`
+    :param pos: Square of the move from 0 to 8
+    :type pos: class: `int`
+    :return: One byte with the move number in the upper and the square in the lower 4 bits
+    :rtype: class: `bytes`
+    """
+    return bytes((seq << 4 | pos,))
+
+
+def encode_game_over(seq: int, pos: int, winner: Optional[int], line: Optional[Tuple[int, int, int]]) -> bytes:
+    """
+    Encode the result of a game for the compact protocol.
+
+    :param seq: Number of the moves made before the last move
+    :type seq: class: `int`
+    :param pos: Square of the last move
+    :type pos: class: `int`
+    :param winner: Number of the player who won, 0 for the player who moved first, or None if the game is drawn
+    :type winner: class: `int` or None
+    :param line: Winning line or None if the game is drawn
+    :type line: class: `tuple[int, int, int]` or None
+    :return: Encoded last move, then 0 for a draw or the number of the winner plus 1, then the winning line
+    :rtype: class: `bytes`
+    """
+    if winner is None or line is None:
+        return encode_move(seq, pos) + b'\x00'
+    return encode_move(seq, pos) + bytes((winner + 1, *line))
+
+
+def game_over_message(game: Game, number: int) -> Union[Dict[str, Union[str, int, bool, None]], bytes]:
+    """
+    Make the message about the result of a game ended by a move for a player.
+
+    :param game: Game record
+    :type game: class: `Game`
+    :param number: Number of the player the message is for
+    :type number: class: `int`
+    :return: Dictionary with the last move, the winner and the winning line, or the same data encoded
+             by `encode_game_over` if the player has chosen the compact protocol
+    :rtype: class: `dict[str, str | int | bool | None]` or `bytes`
+    """
+    seq, pos = game.moves - 1, game.history[-1]
+    winner = None if game.winner is None else game.index(game.winner)
+    line = None if winner is None else game.line(winner)
+
+    if game.binary >> number & 1:
+        return encode_game_over(seq, pos, winner, line)
+    if line is None:
+        return {'is_draw': True, 'pos': pos, 'winner': None}
+    return {'is_draw': False, 'pos': pos, 'winner': game.winner, 'a': line[0], 'b': line[1], 'c': line[2]}
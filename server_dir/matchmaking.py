@@ -0,0 +1,438 @@
+"""Queue of the users looking for an online game and matching of the users by their choices and ratings."""
+
+import time
+import heapq
+import itertools
+from collections import OrderedDict, deque
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from gevent.lock import RLock
+
+
+class WaitingQueue:
+    """
+    Queue of the users who are looking for a game.
+
+    Users are kept in FIFO buckets keyed by sign and turn and split into rating bands, together with an index
+    from user id to entry, so adding, removing and checking membership take constant time, and a search of
+    an opponent looks only at the heads of the compatible bands inside the user's rating window.
+
+    A random sign ("R") or turn ("0") is compatible with any other choice. After waiting for `relax_after` seconds
+    the user's own choices become soft: compatible opponents are still preferred, but an opponent with other choices
+    is accepted too if the opponent's choices have become soft as well.
+
+    The rating window widens with the waiting time, so the users who were not matched are checked again
+    each time their window grows by one band and once more when their choices become soft.
+    """
+
+    signs: Dict[str, Tuple[str, ...]] = {'X': ('O', 'R'), 'O': ('X', 'R'), 'R': ('X', 'O', 'R')}
+    turns: Dict[str, Tuple[str, ...]] = {'1': ('2', '0'), '2': ('1', '0'), '0': ('1', '2', '0')}
+
+    def __init__(self, band: int, window: float, growth: float, max_window: float, relax_after: float,
+                 samples: int, candidates: int = 8, clock: Callable[[], float] = time.time) -> None:
+        """
+        Make constructor method.
+
+        :param band: Width of a rating band
+        :type band: class: `int`
+        :param window: Initial half-width of the rating window
+        :type window: class: `float`
+        :param growth: Growth of the rating window per second of waiting
+        :type growth: class: `float`
+        :param max_window: Maximal half-width of the rating window
+        :type max_window: class: `float`
+        :param relax_after: Number of seconds after which the sign and turn choices of the user become soft
+        :type relax_after: class: `float`
+        :param samples: Number of the last matches of each kind kept to compute the waiting time percentiles
+        :type samples: class: `int`
+        :param candidates: Maximal number of the paired players tried for each user left without an opponent,
+                           defaults to 8
+        :type candidates: class: `int`
+        :param clock: Function returning the current time, defaults to `time.time`
+        :type clock: class: `Callable[[], float]`
+        """
+        self.band: int = band
+        self.window: float = window
+        self.growth: float = growth
+        self.max_window: float = max_window
+        self.relax_after: float = relax_after
+        self.candidates: int = candidates
+        self.clock: Callable[[], float] = clock
+        self._buckets: Dict[Tuple[str, str], Dict[int, 'OrderedDict[str, Dict]']] = {
+            (sign, turn): {} for sign in self.signs for turn in self.turns}
+        self._index: Dict[str, Dict] = {}
+        self._pending: 'deque[Dict]' = deque()
+        self._checks: List[Tuple[float, int, Dict]] = []
+        self._counter: itertools.count = itertools.count()
+        self._lock: RLock = RLock()
+        self._wait_times: Dict[bool, 'deque[float]'] = {False: deque(maxlen=samples), True: deque(maxlen=samples)}
+        self._matches: int = 0
+        self._relaxed_matches: int = 0
+
+    def __len__(self) -> int:
+        """
+        Get the number of users in the queue.
+
+        :return: Number of users in the queue
+        :rtype: class: `int`
+        """
+        return len(self._index)
+
+    def __contains__(self, user_id: str) -> bool:
+        """
+        Check if the user is in the queue.
+
+        :param user_id: Id of user
+        :type user_id: class: `str`
+        :return: True if the user is in the queue, otherwise False
+        :rtype: class: `bool`
+        """
+        return user_id in self._index
+
+    def push(self, user_id: str, sign: str, turn: str, rating: float, joined: float) -> None:
+        """
+        Add the user to the end of the queue, replacing the previous request of the user if there is one.
+
+        :param user_id: Id of user
+        :type user_id: class: `str`
+        :param sign: Sign chosen by the user, "X", "O" or "R" for random
+        :type sign: class: `str`
+        :param turn: Turn chosen by the user, "1", "2" or "0" for random
+        :type turn: class: `str`
+        :param rating: Rating of the user
+        :type rating: class: `float`
+        :param joined: Time when the user joined the queue
+        :type joined: class: `float`
+        """
+        entry = {'user_id': user_id, 'sign': sign, 'turn': turn, 'rating': rating,
+                 'band': int(rating // self.band), 'time': joined}
+
+        with self._lock:
+            self.remove(user_id)
+            self._buckets[(sign, turn)].setdefault(entry['band'], OrderedDict())[user_id] = entry
+            self._index[user_id] = entry
+            self._pending.append(entry)
+
+    def users(self) -> List[str]:
+        """
+        Get the ids of all users in the queue.
+
+        :return: List of ids of users
+        :rtype: class: `list[str]`
+        """
+        with self._lock:
+            return list(self._index)
+
+    def remove(self, user_id: str) -> bool:
+        """
+        Remove the user from the queue.
+
+        :param user_id: Id of user
+        :type user_id: class: `str`
+        :return: True if the user was in the queue, otherwise False
+        :rtype: class: `bool`
+        """
+        with self._lock:
+            entry = self._index.pop(user_id, None)
+            if entry is None:
+                return False
+            bands = self._buckets[(entry['sign'], entry['turn'])]
+            del bands[entry['band']][user_id]
+            if not bands[entry['band']]:
+                del bands[entry['band']]
+            return True
+
+    def pop_pairs(self) -> List[Tuple[Dict, Dict]]:
+        """
+        Take from the queue all the pairs of users that can play with each other.
+
+        Only the users added since the last call and the users whose rating window has grown
+        or whose choices have become soft are checked, the longest waiting first,
+        since any other user has already been checked against the whole queue.
+
+        Each user takes the best opponent found at the moment, so the pairs are a greedy approximation and not
+        a maximum matching: an early pair can take the only opponent of a later user. One augmenting pass
+        (`_augment`) then lets each user left without an opponent break such a pair when the other player of the pair
+        can find another opponent, but longer chains of changed pairs are not searched.
+
+        :return: List of pairs of queue entries, the longest waiting user first in each pair
+        :rtype: class: `list[tuple[dict, dict]]`
+        """
+        with self._lock:
+            now = self.clock()
+
+            while self._checks and self._checks[0][0] <= now:
+                self._pending.append(heapq.heappop(self._checks)[2])
+
+            pending = {entry['user_id']: entry for entry in self._pending if self._index.get(entry['user_id']) is entry}
+            self._pending.clear()
+
+            pairs: List[Tuple[Dict, Dict, bool]] = []
+            unmatched = []
+            for entry in sorted(pending.values(), key=lambda user: user['time']):
+                if self._index.get(entry['user_id']) is not entry:
+                    continue
+
+                opponent, relaxed = self._find_opponent(entry, now)
+                if opponent is None:
+                    self._schedule(entry, now)
+                    unmatched.append(entry)
+                    continue
+
+                self._pair(pairs, entry, opponent, relaxed)
+
+            self._augment(pairs, unmatched, now)
+
+            for first, second, relaxed in pairs:
+                self._wait_times[relaxed].extend((now - first['time'], now - second['time']))
+            self._matches += len(pairs)
+            self._relaxed_matches += sum(relaxed for _, _, relaxed in pairs)
+            return [(first, second) for first, second, _ in pairs]
+
+    def next_check(self) -> Optional[float]:
+        """
+        Get the number of seconds until the next user has to be checked again.
+
+        :return: Number of seconds or None if no user is waiting for a check
+        :rtype: class: `float` or None
+        """
+        with self._lock:
+            if self._pending:
+                return 0.0
+            if not self._checks:
+                return None
+            return max(self._checks[0][0] - self.clock(), 0.0)
+
+    def stats(self) -> Dict[str, Union[int, float]]:
+        """
+        Get the statistics of the queue.
+
+        :return: Dictionary with the queue length, the number of matches, the number of matches made
+                 after the choices became soft and the percentiles of the waiting time in seconds,
+                 separately for the matches of compatible choices ("strict") and the others ("relaxed")
+        :rtype: class: `dict[str, int | float]`
+        """
+        with self._lock:
+            wait_times = {relaxed: sorted(times) for relaxed, times in self._wait_times.items()}
+            result: Dict[str, Union[int, float]] = {'waiting': len(self._index), 'matches': self._matches,
+                                                    'relaxed_matches': self._relaxed_matches}
+
+        for relaxed, kind in ((False, 'strict'), (True, 'relaxed')):
+            times = wait_times[relaxed]
+            for percent in (50, 95, 99):
+                result[f'{kind}_wait_p{percent}'] = \
+                    times[min(len(times) * percent // 100, len(times) - 1)] if times else 0.0
+
+        return result
+
+    def _relaxed(self, entry: Dict, now: float) -> bool:
+        """
+        Check if the choices of the user have become soft.
+
+        :param entry: Queue entry of the user
+        :type entry: class: `dict`
+        :param now: Current time
+        :type now: class: `float`
+        :return: True if the user has waited for `relax_after` seconds, otherwise False
+        :rtype: class: `bool`
+        """
+        return now - entry['time'] >= self.relax_after
+
+    def _window(self, entry: Dict, now: float) -> float:
+        """
+        Get the half-width of the rating window of the user.
+
+        :param entry: Queue entry of the user
+        :type entry: class: `dict`
+        :param now: Current time
+        :type now: class: `float`
+        :return: Half-width of the rating window
+        :rtype: class: `float`
+        """
+        return min(self.window + self.growth * (now - entry['time']), self.max_window)
+
+    def _schedule(self, entry: Dict, now: float) -> None:
+        """
+        Schedule the next check of the user who was not matched.
+
+        :param entry: Queue entry of the user
+        :type entry: class: `dict`
+        :param now: Current time
+        :type now: class: `float`
+        """
+        moments = []
+        if self._window(entry, now) < self.max_window:
+            moments.append(now + self.band / self.growth)
+        if not self._relaxed(entry, now):
+            moments.append(entry['time'] + self.relax_after)
+
+        if moments:
+            heapq.heappush(self._checks, (min(moments), next(self._counter), entry))
+
+    def _pair(self, pairs: List[Tuple[Dict, Dict, bool]], entry: Dict, opponent: Dict, relaxed: bool) -> None:
+        """
+        Take two users from the queue as a pair.
+
+        :param pairs: List of the pairs made in this pass, the new pair is added to it
+        :type pairs: class: `list[tuple[dict, dict, bool]]`
+        :param entry: Queue entry of the user who found the opponent
+        :type entry: class: `dict`
+        :param opponent: Queue entry of the opponent
+        :type opponent: class: `dict`
+        :param relaxed: Whether the user's choices were relaxed to find the opponent
+        :type relaxed: class: `bool`
+        """
+        for user in (entry, opponent):
+            self.remove(user['user_id'])
+        pairs.append((entry, opponent, relaxed) if entry['time'] <= opponent['time'] else (opponent, entry, relaxed))
+
+    def _augment(self, pairs: List[Tuple[Dict, Dict, bool]], unmatched: List[Dict], now: float) -> None:
+        """
+        Make more pairs by breaking the pairs of this pass whose players have other opponents.
+
+        A user left without an opponent takes a player of a pair made in this pass if the user and the player accept
+        each other, and the partner of the player finds another opponent in the queue. The players of the pairs
+        are indexed by their sign, turn and rating band, so only the players the user accepts are tried,
+        from the closest rating band, and at most `candidates` of them, so a burst of users with the same choices
+        costs a few searches per user and not a search per paired player.
+
+        :param pairs: List of the pairs made in this pass, changed in place
+        :type pairs: class: `list[tuple[dict, dict, bool]]`
+        :param unmatched: Queue entries of the users of this pass left without an opponent, the longest waiting first
+        :type unmatched: class: `list[dict]`
+        :param now: Current time
+        :type now: class: `float`
+        """
+        players: Dict[Tuple[str, str, int], List[Dict]] = {}
+        numbers: Dict[str, int] = {}
+        for number, pair in enumerate(pairs):
+            for player in pair[:2]:
+                players.setdefault((player['sign'], player['turn'], player['band']), []).append(player)
+                numbers[player['user_id']] = number
+
+        for entry in unmatched:
+            if self._index.get(entry['user_id']) is not entry:
+                continue
+
+            compatible = [(sign, turn) for sign in self.signs[entry['sign']] for turn in self.turns[entry['turn']]]
+            keys = list(self._buckets) if self._relaxed(entry, now) else compatible
+            window = self._window(entry, now)
+            bands = sorted(range(int((entry['rating'] - window) // self.band),
+                                 int((entry['rating'] + window) // self.band) + 1),
+                           key=lambda band, own=entry['band']: abs(band - own))
+            candidates = (player for band in bands for key in keys for player in players.get((*key, band), ()))
+
+            for player in itertools.islice(candidates, self.candidates):
+                if self._rematch(pairs, numbers, entry, player, (player['sign'], player['turn']) not in compatible,
+                                 now):
+                    break
+
+    def _rematch(self, pairs: List[Tuple[Dict, Dict, bool]], numbers: Dict[str, int], entry: Dict, player: Dict,
+                 relaxed: bool, now: float) -> bool:
+        """
+        Give the player of a pair to the user if the player accepts the user and the partner finds another opponent.
+
+        :param pairs: List of the pairs made in this pass, changed in place
+        :type pairs: class: `list[tuple[dict, dict, bool]]`
+        :param numbers: Numbers of the pairs in the list by the ids of their players, changed in place
+        :type numbers: class: `dict[str, int]`
+        :param entry: Queue entry of the user without an opponent
+        :type entry: class: `dict`
+        :param player: Queue entry of the player the user accepts
+        :type player: class: `dict`
+        :param relaxed: Whether the user's choices are relaxed to accept the player
+        :type relaxed: class: `bool`
+        :param now: Current time
+        :type now: class: `float`
+        :return: True if the pair was changed, otherwise False
+        :rtype: class: `bool`
+        """
+        if relaxed and not self._relaxed(player, now):
+            return False
+
+        number = numbers[player['user_id']]
+        first, second, _ = pairs[number]
+        partner = second if first is player else first
+        opponent, partner_relaxed = self._find_opponent(partner, now, entry)
+        if opponent is None:
+            return False
+
+        for user in (entry, opponent):
+            self.remove(user['user_id'])
+        pairs[number] = (player, entry, relaxed) if player['time'] <= entry['time'] else (entry, player, relaxed)
+        pairs.append((partner, opponent, partner_relaxed) if partner['time'] <= opponent['time']
+                     else (opponent, partner, partner_relaxed))
+        numbers[entry['user_id']] = number
+        numbers[partner['user_id']] = numbers[opponent['user_id']] = len(pairs) - 1
+        return True
+
+    def _find_opponent(self, entry: Dict, now: float, skip: Optional[Dict] = None) -> Tuple[Optional[Dict], bool]:
+        """
+        Find an opponent for the user inside the user's rating window.
+
+        Compatible opponents are searched first, and only if there are none and the user's choices have become soft,
+        the others whose choices have become soft too. The opponent is taken from the closest rating band,
+        and the longest waiting one among the heads of the buckets is preferred.
+
+        :param entry: Queue entry of the user
+        :type entry: class: `dict`
+        :param now: Current time
+        :type now: class: `float`
+        :param skip: Queue entry of a user who must not be taken, defaults to None
+        :type skip: class: `dict` or None
+        :return: Queue entry of the opponent or None and whether the user's choices were relaxed to find the opponent
+        :rtype: class: `tuple[dict | None, bool]`
+        """
+        compatible = [(sign, turn) for sign in self.signs[entry['sign']] for turn in self.turns[entry['turn']]]
+        opponent = self._search(entry, now, compatible, skip)
+
+        if opponent is not None or not self._relaxed(entry, now):
+            return opponent, False
+
+        others = [key for key in self._buckets if key not in compatible]
+        opponent = self._search(entry, now, others, skip, relaxed=True)
+        return opponent, opponent is not None
+
+    def _search(self, entry: Dict, now: float, keys: List[Tuple[str, str]], skip: Optional[Dict] = None,
+                relaxed: bool = False) -> Optional[Dict]:
+        """
+        Find an opponent from the closest rating band inside the window of the user in the buckets.
+
+        Among the heads of the buckets the user with the fewest random choices is taken, so that the users
+        who can play with anybody are left for the others, and then the longest waiting one.
+        A relaxed search takes only the heads whose choices have become soft: the buckets keep the users
+        in the order they joined, so the others in a bucket have waited no longer than its head.
+
+        :param entry: Queue entry of the user
+        :type entry: class: `dict`
+        :param now: Current time
+        :type now: class: `float`
+        :param keys: Sign and turn keys of the buckets to search
+        :type keys: class: `list[tuple[str, str]]`
+        :param skip: Queue entry of a user who must not be taken, defaults to None
+        :type skip: class: `dict` or None
+        :param relaxed: Whether the buckets hold choices incompatible with the user's ones, defaults to False
+        :type relaxed: class: `bool`
+        :return: Queue entry of the opponent or None
+        :rtype: class: `dict` or None
+        """
+        buckets = [self._buckets[key] for key in keys if self._buckets[key]]
+        if not buckets:
+            return None
+
+        window = self._window(entry, now)
+        low = int((entry['rating'] - window) // self.band)
+        high = int((entry['rating'] + window) // self.band)
+
+        for distance in range(max(entry['band'] - low, high - entry['band']) + 1):
+            heads = []
+            for band in dict.fromkeys((entry['band'] - distance, entry['band'] + distance)):
+                if low <= band <= high:
+                    for bands in buckets:
+                        head = next((user for user in bands.get(band, {}).values()
+                                     if user is not entry and user is not skip), None)
+                        if head is not None and (not relaxed or self._relaxed(head, now)):
+                            heads.append(head)
+            if heads:
+                return min(heads, key=lambda head: ((head['sign'] == 'R') + (head['turn'] == '0'), head['time']))
+
+        return None
@@ -0,0 +1,312 @@
+"""
+Simulator and benchmark of the game search.
+
+The module drives the matchmaking code of the server (`enqueue`, `cancel_search` and `run_matcher`,
+which are used by `/join_queue`, `/reset_search` and `start_game`) with synthetic players on a simulated clock,
+without HTTP and sockets, and reports the throughput, the time to match percentiles, the queue length over time
+and the CPU time spent per match.
+
+Run it from the server directory, for example::
+
+    python matchmaking_bench.py --rate 50 --duration 600 --patience 120
+
+The server is imported with an in-memory database unless the "DATABASE_URI" environment variable is set,
+so the simulation never writes to the database of the server.
+"""
+
+import os
+import sys
+import json
+import time
+import heapq
+import random
+import argparse
+from typing import Any, Dict, List, Optional, Tuple
+from state_store import InProcessStore
+
+os.environ.setdefault('DATABASE_URI', 'sqlite://')
+
+import server  # noqa: E402  pylint: disable=wrong-import-position
+
+
+def percentile(values: List[float], percent: int) -> float:
+    """
+    Get a percentile of the values by the nearest rank.
+
+    :param values: Sorted list of values
+    :type values: class: `list[float]`
+    :param percent: Percent from 0 to 100
+    :type percent: class: `int`
+    :return: Percentile or 0 if there are no values
+    :rtype: class: `float`
+    """
+    if not values:
+        return 0.0
+    return values[min(len(values) * percent // 100, len(values) - 1)]
+
+
+def parse_weights(text: str) -> Dict[str, float]:
+    """
+    Parse the weights of choices written as "X=0.6,O=0.25,R=0.15".
+
+    :param text: Weights of choices
+    :type text: class: `str`
+    :return: Dictionary of choices and their weights
+    :rtype: class: `dict[str, float]`
+    """
+    return {key: float(value) for key, value in (item.split('=') for item in text.split(','))}
+
+
+class Simulation:
+    """
+    Simulation of players who look for a game.
+
+    Players arrive as a Poisson process, choose a sign and a turn with the given weights, and cancel the search
+    after an exponentially distributed patience if they are still waiting. The matcher runs the same way
+    as in `server.start_game`: one tick after the queue changes, or when the queue asks to be checked again.
+
+    :param rate: Mean number of arriving players per second
+    :type rate: class: `float`
+    :param duration: Number of simulated seconds during which players arrive
+    :type duration: class: `float`
+    :param patience: Mean number of seconds after which a waiting player cancels the search, 0 to never cancel
+    :type patience: class: `float`
+    :param signs: Weights of the sign choices
+    :type signs: class: `dict[str, float]`
+    :param turns: Weights of the turn choices
+    :type turns: class: `dict[str, float]`
+    :param rating_spread: Standard deviation of the ratings of players around the default rating
+    :type rating_spread: class: `float`
+    :param drain: Number of simulated seconds after the last arrival after which players still waiting are left
+    :type drain: class: `float`
+    :param sample_interval: Number of simulated seconds between samples of the queue length
+    :type sample_interval: class: `float`
+    :param seed: Seed of the random generator
+    :type seed: class: `int` or None
+    """
+
+    def __init__(self, rate: float, duration: float, patience: float, signs: Dict[str, float],
+                 turns: Dict[str, float], rating_spread: float, drain: float,
+                 sample_interval: float, seed: Optional[int]) -> None:
+        """Make constructor method."""
+        self.rate: float = rate
+        self.duration: float = duration
+        self.patience: float = patience
+        self.signs: Dict[str, float] = signs
+        self.turns: Dict[str, float] = turns
+        self.rating_spread: float = rating_spread
+        self.drain: float = drain
+        self.sample_interval: float = sample_interval
+        self.random: random.Random = random.Random(seed)
+        self.tick: float = server.app.config['MATCH_TICK']
+
+        self._now: float = 0.0
+        self._events: List[Tuple[float, int, str, str]] = []
+        self._sequence: int = 0
+        self._tick_at: Optional[float] = None
+        self._joined: Dict[str, float] = {}
+        self._wait_times: List[float] = []
+        self._queue_lengths: List[Tuple[float, int]] = []
+        self._arrivals: int = 0
+        self._cancels: int = 0
+        self._matches: int = 0
+        self._matcher_cpu: float = 0.0
+        self._requests_cpu: float = 0.0
+
+    def now(self) -> float:
+        """
+        Get the simulated time.
+
+        :return: Number of simulated seconds since the start
+        :rtype: class: `float`
+        """
+        return self._now
+
+    def run(self) -> Dict[str, Any]:
+        """
+        Run the simulation until all arrived players are matched, have cancelled the search or the drain time is over.
+
+        :return: Report of the simulation
+        :rtype: class: `dict[str, Any]`
+        """
+        server.store = InProcessStore()
+        server.waiting_players = server.WaitingQueue(
+            server.app.config['RATING_BAND'], server.app.config['RATING_WINDOW'],
+            server.app.config['RATING_WINDOW_GROWTH'], server.app.config['RATING_WINDOW_MAX'],
+            server.app.config['MATCH_RELAX_AFTER'], server.app.config['QUEUE_STATS_SAMPLES'],
+            server.app.config['MATCH_AUGMENT_CANDIDATES'], clock=self.now)
+        server.notify_match = self._on_match
+
+        self._schedule(self.random.expovariate(self.rate), 'arrive', '')
+        self._schedule(0.0, 'sample', '')
+        leader = False
+        started = time.perf_counter()
+
+        while self._events:
+            self._now, _, kind, user_id = heapq.heappop(self._events)
+            if self._now > self.duration + self.drain:
+                break
+
+            if kind == 'arrive':
+                self._arrive()
+            elif kind == 'cancel':
+                self._cancel(user_id)
+            elif kind == 'sample':
+                self._queue_lengths.append((self._now, len(server.waiting_players)))
+                if self._now < self.duration or self._joined:
+                    self._schedule(self._now + self.sample_interval, 'sample', '')
+            elif kind == 'tick' and self._tick_at == self._now:
+                self._tick_at = None
+                cpu = time.process_time()
+                leader = server.run_matcher(leader)
+                self._matcher_cpu += time.process_time() - cpu
+                next_check = server.waiting_players.next_check()
+                if next_check is not None:
+                    self._wake(self._now + next_check)
+
+        return self._report(time.perf_counter() - started)
+
+    def _schedule(self, moment: float, kind: str, user_id: str) -> None:
+        """
+        Schedule a simulation event.
+
+        :param moment: Simulated time of the event
+        :type moment: class: `float`
+        :param kind: Kind of the event: "arrive", "cancel", "tick" or "sample"
+        :type kind: class: `str`
+        :param user_id: Id of the player the event is about, or an empty string
+        :type user_id: class: `str`
+        """
+        self._sequence += 1
+        heapq.heappush(self._events, (moment, self._sequence, kind, user_id))
+
+    def _wake(self, moment: float) -> None:
+        """
+        Wake the matcher, which makes a pass one tick later unless it is already going to make one earlier.
+
+        :param moment: Simulated time when the matcher is woken
+        :type moment: class: `float`
+        """
+        moment += self.tick
+        if self._tick_at is None or moment < self._tick_at:
+            self._tick_at = moment
+            self._schedule(moment, 'tick', '')
+
+    def _arrive(self) -> None:
+        """Add a new player to the queue and schedule the next arrival."""
+        self._arrivals += 1
+        user_id = f'player{self._arrivals}'
+        sign = self.random.choices(list(self.signs), weights=list(self.signs.values()))[0]
+        turn = self.random.choices(list(self.turns), weights=list(self.turns.values()))[0]
+        rating = self.random.gauss(server.app.config['RATING_DEFAULT'], self.rating_spread)
+
+        self._joined[user_id] = self._now
+        cpu = time.process_time()
+        server.enqueue(user_id, user_id, sign, turn, rating, self._now)
+        self._requests_cpu += time.process_time() - cpu
+        self._wake(self._now)
+
+        if self.patience > 0:
+            self._schedule(self._now + self.random.expovariate(1 / self.patience), 'cancel', user_id)
+
+        moment = self._now + self.random.expovariate(self.rate)
+        if moment < self.duration:
+            self._schedule(moment, 'arrive', '')
+
+    def _cancel(self, user_id: str) -> None:
+        """
+        Cancel the search of the player if the player is still waiting.
+
+        :param user_id: Id of the player
+        :type user_id: class: `str`
+        """
+        if self._joined.pop(user_id, None) is None:
+            return
+
+        self._cancels += 1
+        cpu = time.process_time()
+        server.cancel_search(user_id)
+        self._requests_cpu += time.process_time() - cpu
+        self._wake(self._now)
+
+    def _on_match(self, user_id: str, opponent_id: str, game_id: str) -> None:
+        """
+        Record the found game instead of notifying the player.
+
+        :param user_id: Id of the player
+        :type user_id: class: `str`
+        :param opponent_id: Id of the opponent
+        :type opponent_id: class: `str`
+        :param game_id: Id of the game
+        :type game_id: class: `str`
+        """
+        joined = self._joined.pop(user_id, None)
+        if joined is not None:
+            self._wait_times.append(self._now - joined)
+        if user_id < opponent_id:
+            self._matches += 1
+            server.store.pop('games', game_id)
+            server.store.pop('user_games', user_id)
+            server.store.pop('user_games', opponent_id)
+
+    def _report(self, wall_time: float) -> Dict[str, Any]:
+        """
+        Make the report of the simulation.
+
+        :param wall_time: Number of real seconds the simulation took
+        :type wall_time: class: `float`
+        :return: Report of the simulation
+        :rtype: class: `dict[str, Any]`
+        """
+        wait_times = sorted(self._wait_times)
+        lengths = [length for _, length in self._queue_lengths]
+
+        return {'arrivals': self._arrivals, 'matches': self._matches, 'cancels': self._cancels,
+                'waiting': len(self._joined),
+                'relaxed_matches': server.waiting_players.stats()['relaxed_matches'],
+                'simulated_seconds': self._now, 'wall_seconds': wall_time,
+                'matches_per_second': self._matches / self.duration,
+                'wait_p50': percentile(wait_times, 50), 'wait_p95': percentile(wait_times, 95),
+                'wait_p99': percentile(wait_times, 99),
+                'queue_length_mean': sum(lengths) / len(lengths) if lengths else 0.0,
+                'queue_length_max': max(lengths, default=0),
+                'matcher_cpu_per_match_ms': 1000 * self._matcher_cpu / self._matches if self._matches else 0.0,
+                'requests_cpu_per_match_ms': 1000 * self._requests_cpu / self._matches if self._matches else 0.0,
+                'queue_length': self._queue_lengths}
+
+
+def main() -> None:
+    """Parse the command line arguments, run the simulation and print the report."""
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n', maxsplit=1)[0])
+    parser.add_argument('--rate', type=float, default=20.0, help='mean number of arriving players per second')
+    parser.add_argument('--duration', type=float, default=300.0, help='number of seconds during which players arrive')
+    parser.add_argument('--patience', type=float, default=120.0,
+                        help='mean number of seconds after which a waiting player cancels, 0 to never cancel')
+    parser.add_argument('--signs', type=parse_weights, default='X=0.6,O=0.25,R=0.15', help='weights of signs')
+    parser.add_argument('--turns', type=parse_weights, default='1=0.6,2=0.25,0=0.15', help='weights of turns')
+    parser.add_argument('--drain', type=float, default=300.0,
+                        help='number of seconds after the last arrival during which waiting players are still matched')
+    parser.add_argument('--rating-spread', type=float, default=200.0, help='standard deviation of ratings')
+    parser.add_argument('--sample-interval', type=float, default=10.0, help='seconds between queue length samples')
+    parser.add_argument('--seed', type=int, default=None, help='seed of the random generator')
+    parser.add_argument('--json', action='store_true', help='print the full report as JSON')
+    args = parser.parse_args()
+
+    report = Simulation(args.rate, args.duration, args.patience, args.signs, args.turns, args.rating_spread,
+                        args.drain, args.sample_interval, args.seed).run()
+
+    if args.json:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+        return
+
+    for key, value in report.items():
+        if key != 'queue_length':
+            print(f'{key:30} {value:.3f}' if isinstance(value, float) else f'{key:30} {value}')
+    print('queue length over time:')
+    for moment, length in report['queue_length']:
+        print(f'{moment:10.1f} {length}')
+
+
+if __name__ == '__main__':
+    main()
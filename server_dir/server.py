@@ -1,31 +1,71 @@
 """Server for online game."""
 
 import uuid
+import atexit
 import os
-import threading
 import time
 import hashlib
 import random
 from datetime import timedelta
-from typing import Optional, List, Dict, Union
+from typing import Optional, List, Dict, Set, Union, Tuple
 import flask
 import jwt
+from gevent.event import Event
 from flask import Flask, request, jsonify, session, make_response
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, text, bindparam, tuple_
 from flask_socketio import SocketIO, emit, join_room, leave_room
+from state_store import StateStore, create_store
+from matchmaking import WaitingQueue
+from game_record import Game, encode_move, encode_game_over, game_over_message
+from sweeper import Sweeper
+from batch_writers import HistoryWriter, StatsBuffer
+from caches import ProfileCache, Leaderboard
 
 
 app = Flask(__name__)
-socketio = SocketIO(app, async_mode='gevent')
+socketio = SocketIO(app, async_mode='gevent', message_queue=os.environ.get('SOCKETIO_MESSAGE_QUEUE') or None)
 
 db_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), 'database'))
 
 db_path = os.path.join(db_dir, 'game.db')
 
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{db_path}'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URI', f'sqlite:///{db_path}')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.secret_key = 'TicTacToe_multiplayer_online_game'
 app.config['PERMANENT_SESSION_LIFETIME'] = timedelta(days=999999999)
+app.config['SEARCH_WAIT_LIMIT'] = 30
+app.config['RATING_DEFAULT'] = 1500.0
+app.config['RATING_K_FACTOR'] = 32.0
+app.config['RATING_BAND'] = 50
+app.config['RATING_WINDOW'] = 100.0
+app.config['RATING_WINDOW_GROWTH'] = 10.0
+app.config['RATING_WINDOW_MAX'] = 1000.0
+app.config['MATCH_RELAX_AFTER'] = 30.0
+app.config['QUEUE_STATS_SAMPLES'] = 10000
+app.config['MATCH_AUGMENT_CANDIDATES'] = 8
+app.config['MATCH_TICK'] = 0.1
+app.config['STATE_STORE'] = os.environ.get('STATE_STORE', 'memory')
+app.config['WORKERS'] = int(os.environ.get('WORKERS', '1'))
+app.config['STATE_POLL_INTERVAL'] = 0.2
+app.config['MATCHER_LEASE'] = 5.0
+app.config['GAME_TTL'] = 600.0
+app.config['QUEUE_TTL'] = 120.0
+app.config['SESSION_TTL'] = 3600.0
+app.config['SID_TTL'] = 60.0
+app.config['SWEEP_INTERVAL'] = 1.0
+app.config['READY_TIMEOUT'] = 15.0
+app.config['RECONNECT_GRACE'] = 30.0
+app.config['LIVE_GAMES_LIMIT'] = 50
+app.config['HISTORY_QUEUE_SIZE'] = 10000
+app.config['HISTORY_BATCH_SIZE'] = 200
+app.config['HISTORY_FLUSH_INTERVAL'] = 0.5
+app.config['STATS_FLUSH_INTERVAL'] = 0.3
+app.config['STATS_FLUSH_LIMIT'] = 500
+app.config['PROFILE_CACHE_SIZE'] = 10000
+app.config['PROFILE_CACHE_TTL'] = 300.0
+app.config['LEADERBOARD_SIZE'] = 100
+app.config['LEADERBOARD_PAGE'] = 20
 
 db = SQLAlchemy(app)
 
@@ -58,11 +98,50 @@ class OnlineGameStat(db.Model):
     games_won = db.Column(db.Integer, default=0, nullable=False)
     games_draws = db.Column(db.Integer, default=0, nullable=False)
     games_defeat = db.Column(db.Integer, default=0, nullable=False)
+    rating = db.Column(db.Float, default=app.config['RATING_DEFAULT'], nullable=False)
+
+    __table_args__ = (db.Index('ix_online_game_stat_rating_id', 'rating', 'id'),)
+
+
+class OnlineGame(db.Model):
+    """Finished online game class for use in SQLAlchemy."""
+
+    id = db.Column(db.String(36), primary_key=True)
+    first_player_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False, index=True)
+    second_player_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=False, index=True)
+    signs = db.Column(db.String(2), nullable=False)
+    winner_id = db.Column(db.String(36), db.ForeignKey('user.id'), nullable=True)
+    forfeit = db.Column(db.Boolean, default=False, nullable=False)
+    created = db.Column(db.Float, nullable=False)
+    finished = db.Column(db.Float, nullable=False)
+    moves = db.relationship('OnlineGameMove', backref='game', lazy=True)
+
+
+class OnlineGameMove(db.Model):
+    """Move of a finished online game class for use in SQLAlchemy, made by the first player if the number is even."""
+
+    game_id = db.Column(db.String(36), db.ForeignKey('online_game.id'), nullable=False, primary_key=True)
+    number = db.Column(db.Integer, nullable=False, primary_key=True, autoincrement=False)
+    square = db.Column(db.Integer, nullable=False)
+
+
+def migrate_database() -> None:
+    """Add the columns and indexes missing in the database created by an older version of the server."""
+    columns = {column['name'] for column in inspect(db.engine).get_columns('online_game_stat')}
+
+    if 'rating' not in columns:
+        with db.engine.begin() as connection:
+            connection.execute(text(f"ALTER TABLE online_game_stat ADD COLUMN rating FLOAT NOT NULL "
+                                    f"DEFAULT {app.config['RATING_DEFAULT']}"))
+
+    with db.engine.begin() as connection:
+        connection.execute(text("CREATE INDEX IF NOT EXISTS ix_online_game_stat_rating_id "
+                                "ON online_game_stat (rating, id)"))
 
 
 with app.app_context():
-    if not os.path.exists(db_path):
-        db.create_all()
+    db.create_all()
+    migrate_database()
 
 
 def hash_password(password: str) -> str:
@@ -101,78 +180,842 @@ def create_user(username: str, password: str) -> str:
     db.session.add(computer_stat)
     db.session.add(online_stat)
     db.session.commit()
+    profiles.invalidate(user_id)
+    leaderboard.update(user_id, username, app.config['RATING_DEFAULT'])
+    count_ratings_write()
     return user_id
 
 
-def authenticate_user(username: str, password: str) -> Optional[str]:
+def authenticate_user(username: str, password: str) -> Optional[Dict[str, Union[str, Dict[str, float]]]]:
     """
-    Verify the existence of a user.
+    Verify the existence of a user and load the profile of the user.
 
     :param username: User username
     :type username: class: `str`
     :param password: User password
     :type password: class `str`
-    :return: Id of user or None
-    :rtype: class: `str` or None
+    :return: Profile of user made by `load_profile` or None
+    :rtype: class: `dict[str, str | dict[str, float]]` or None
     """
-    hashed_password = hash_password(password)
-    user = User.query.filter_by(username=username, password=hashed_password).first()
-    if user:
-        return user.id
+    return load_profile(User.username == username, User.password == hash_password(password))
+
+
+OUTCOME_COLUMNS: Dict[str, str] = {'win': 'games_won', 'draw': 'games_draws', 'defeat': 'games_defeat'}
+
+
+def count_result(model: type, user_id: str, outcome: str, rating: float = 0.0) -> None:
+    """
+    Add the result of a game to the statistics of the user.
+
+    The result is added to the changes of the statistics waiting in `stats_buffer`, which are written
+    to the database as increments of the counters, so results recorded at the same time are never lost.
+
+    :param model: Statistics class, `ComputerGameStat` or `OnlineGameStat`
+    :type model: class: `type`
+    :param user_id: Id of user
+    :type user_id: class: `str`
+    :param outcome: Outcome of the game for the user: "win", "draw" or "defeat"
+    :type outcome: class: `str`
+    :param rating: Change of the rating of the user, only for `OnlineGameStat`, defaults to 0
+    :type rating: class: `float`
+    """
+    deltas = {'games_played': 1, OUTCOME_COLUMNS[outcome]: 1}
+    if rating:
+        deltas['rating'] = rating
+
+    stats_buffer.add(model, user_id, deltas)
+    profiles.invalidate(user_id)
+
+
+def load_profile(*criteria) -> Optional[Dict[str, Union[str, Dict[str, float]]]]:
+    """
+    Load the profile of a user with both statistics by one joined query.
+
+    The changes of the statistics that are not written to the database yet are added to them.
+
+    :param criteria: Conditions on the `User` columns choosing the user
+    :return: Dictionary with the id and the username of user and the statistics of computer and online games
+             as the client reads them, or None if there is no such user
+    :rtype: class: `dict[str, str | dict[str, float]]` or None
+    """
+    row = db.session.query(User.id, User.username, ComputerGameStat, OnlineGameStat).join(
+        ComputerGameStat, ComputerGameStat.id == User.id).join(
+        OnlineGameStat, OnlineGameStat.id == User.id).filter(*criteria).first()
+    if row is None:
+        return None
+
+    user_id, username, pc_row, friend_row = row
+    pc_stat = stat_values(ComputerGameStat, user_id, pc_row)
+    friend_stat = stat_values(OnlineGameStat, user_id, friend_row)
+
+    return {'user_id': user_id, 'user': username,
+            'pc_stat': {"drawn_game": pc_stat['games_draws'], "Player_win": pc_stat['games_won'],
+                        "Computer_win": pc_stat['games_defeat']},
+            'friend_stat': {"drawn_game": friend_stat['games_draws'], "Player1_win": friend_stat['games_won'],
+                            "Player2_win": friend_stat['games_defeat']}}
+
+
+def stat_values(model: type, user_id: str, row: db.Model) -> Dict[str, float]:
+    """
+    Get the statistics of the user together with the changes that are not written to the database yet.
+
+    :param model: Statistics class, `ComputerGameStat` or `OnlineGameStat`
+    :type model: class: `type`
+    :param user_id: Id of user
+    :type user_id: class: `str`
+    :param row: Statistics row of the user loaded from the database
+    :type row: class: `ComputerGameStat` or `OnlineGameStat`
+    :return: Dictionary with the values of the statistics columns
+    :rtype: class: `dict[str, float]`
+    """
+    pending = stats_buffer.pending(model, user_id)
+
+    return {column: getattr(row, column) + pending.get(column, 0) for column in stat_columns(model)}
+
+
+def stat_columns(model: type) -> Tuple[str, ...]:
+    """
+    Get the names of the columns of the statistics class that are changed by the results of games.
+
+    :param model: Statistics class, `ComputerGameStat` or `OnlineGameStat`
+    :type model: class: `type`
+    :return: Names of the columns
+    :rtype: class: `tuple[str, ...]`
+    """
+    return tuple(column for column in ('games_played', 'games_won', 'games_draws', 'games_defeat', 'rating')
+                 if column in model.__table__.c)
+
+
+def record_result(winner_id: str, loser_id: str, is_draw: bool) -> None:
+    """
+    Record the result of an online game in the statistics and the Elo ratings of two users.
+
+    :param winner_id: Id of the user who won the game, or of any of the users if the game is drawn
+    :type winner_id: class: `str`
+    :param loser_id: Id of the user who lost the game, or of the other user if the game is drawn
+    :type loser_id: class: `str`
+    :param is_draw: Whether the game is drawn
+    :type is_draw: class: `bool`
+    """
+    rows = db.session.query(OnlineGameStat.id, User.username, OnlineGameStat.rating).join(
+        User, User.id == OnlineGameStat.id).filter(OnlineGameStat.id.in_((winner_id, loser_id))).all()
+    usernames = {user_id: username for user_id, username, _ in rows}
+    ratings = {user_id: rating + stats_buffer.pending(OnlineGameStat, user_id).get('rating', 0.0)
+               for user_id, _, rating in rows}
+
+    expected = 1 / (1 + 10 ** ((ratings[loser_id] - ratings[winner_id]) / 400))
+    delta = app.config['RATING_K_FACTOR'] * ((0.5 if is_draw else 1.0) - expected)
+
+    count_result(OnlineGameStat, winner_id, 'draw' if is_draw else 'win', delta)
+    count_result(OnlineGameStat, loser_id, 'draw' if is_draw else 'defeat', -delta)
+    leaderboard.update(winner_id, usernames[winner_id], ratings[winner_id] + delta)
+    leaderboard.update(loser_id, usernames[loser_id], ratings[loser_id] - delta)
+
+
+def load_ranking(limit: int, after: Optional[Tuple[float, str]] = None) -> List[Tuple[str, str, float]]:
+    """
+    Load users in the order of their ratings by the index on the rating.
+
+    Users with equal ratings are ordered by their ids, and the next users are found by the rating and the id
+    of the last user of the previous page, so a page takes the same time wherever it is.
+
+    :param limit: Maximal number of users
+    :type limit: class: `int`
+    :param after: Rating and id of the user after whom the users are loaded, defaults to the top
+    :type after: class: `tuple[float, str]` or None
+    :return: List of ids, usernames and ratings of the users
+    :rtype: class: `list[tuple[str, str, float]]`
+    """
+    query = db.session.query(OnlineGameStat.id, User.username, OnlineGameStat.rating).join(
+        User, User.id == OnlineGameStat.id)
+    if after is not None:
+        query = query.filter(tuple_(OnlineGameStat.rating, OnlineGameStat.id) < tuple_(*after))
+
+    return [tuple(row) for row in query.order_by(OnlineGameStat.rating.desc(), OnlineGameStat.id.desc()).limit(limit)]
+
+
+def load_top(size: int) -> List[Tuple[str, str, float]]:
+    """
+    Load the best users with the changes of their ratings that are not written to the database yet.
+
+    The users with pending changes can move up or down from their places in the database, so the users who are
+    among the best by their written ratings are loaded together with every user who has pending changes,
+    and the result is sorted again.
+
+    :param size: Number of users
+    :type size: class: `int`
+    :return: List of ids, usernames and ratings of the users
+    :rtype: class: `list[tuple[str, str, float]]`
+    """
+    pending = {user_id: stats_buffer.pending(OnlineGameStat, user_id).get('rating', 0.0)
+               for user_id in stats_buffer.users(OnlineGameStat)}
+    rows = {user_id: (username, rating) for user_id, username, rating in load_ranking(size + len(pending))}
+    if pending:
+        rows.update((user_id, (username, rating)) for user_id, username, rating in db.session.query(
+            OnlineGameStat.id, User.username, OnlineGameStat.rating).join(
+            User, User.id == OnlineGameStat.id).filter(OnlineGameStat.id.in_(pending)))
+
+    users = [(user_id, username, rating + pending.get(user_id, 0.0)) for user_id, (username, rating) in rows.items()]
+    return sorted(users, key=lambda user: (user[2], user[0]), reverse=True)[:size]
+
+
+def write_stats(batch: List[Tuple[type, str, Dict[str, float]]]) -> None:
+    """
+    Add a batch of changes to the statistics in the database in one transaction.
+
+    The rows of each statistics class are updated by one executemany UPDATE statement incrementing all the columns.
+
+    :param batch: List of statistics classes, ids of users and changes of the columns
+    :type batch: class: `list[tuple[type, str, dict[str, float]]]`
+    """
+    with app.app_context(), db.engine.begin() as connection:
+        for model in (ComputerGameStat, OnlineGameStat):
+            columns = stat_columns(model)
+            rows = [{'user_id': user_id, **{f'delta_{column}': deltas.get(column, 0) for column in columns}}
+                    for row_model, user_id, deltas in batch if row_model is model]
+            if not rows:
+                continue
+
+            table = model.__table__
+            connection.execute(table.update().where(table.c.id == bindparam('user_id')).values(
+                {column: table.c[column] + bindparam(f'delta_{column}') for column in columns}), rows)
+
+    count_profile_writes({user_id for _, user_id, _ in batch})
+    if any(model is OnlineGameStat for model, _, _ in batch):
+        count_ratings_write()
+
+
+def count_profile_writes(user_ids: Set[str]) -> None:
+    """
+    Count the statistics written to the database by this worker in the versions of the profiles shared by the workers.
+
+    The other workers see the new versions and load the profiles again instead of taking them from their caches.
+
+    :param user_ids: Ids of the users whose statistics were written
+    :type user_ids: class: `set[str]`
+    """
+    with store.lock():
+        versions = {user_id: (store.get('profile_versions', user_id) or 0) + 1 for user_id in user_ids}
+        for user_id, version in versions.items():
+            store.set('profile_versions', user_id, version)
+    for user_id, version in versions.items():
+        profiles.written(user_id, version)
+
+
+def count_ratings_write() -> None:
+    """
+    Count the ratings written to the database by this worker in the version of the ratings shared by the workers.
+
+    The other workers see the new version and load their tops of the leaderboard again.
+    """
+    with store.lock():
+        version = (store.get('versions', 'ratings') or 0) + 1
+        store.set('versions', 'ratings', version)
+    leaderboard.written(version)
+
+
+def write_history(batch: List[Tuple[Dict, List[Dict]]]) -> None:
+    """
+    Write a batch of finished games and their moves to the database in one transaction.
+
+    :param batch: List of the rows of the games and the rows of their moves
+    :type batch: class: `list[tuple[dict, list[dict]]]`
+    """
+    moves = [move for _, game_moves in batch for move in game_moves]
+
+    with app.app_context(), db.engine.begin() as connection:
+        connection.execute(OnlineGame.__table__.insert(), [game for game, _ in batch])
+        if moves:
+            connection.execute(OnlineGameMove.__table__.insert(), moves)
+
+
+def check_deployment(workers: int, shared: bool, message_queue: Optional[str]) -> None:
+    """
+    Refuse to start the server when its workers would not see the state or the Socket.IO events of each other.
+
+    :param workers: Number of the server workers
+    :type workers: class: `int`
+    :param shared: Whether the state store is shared by the workers
+    :type shared: class: `bool`
+    :param message_queue: URL of the Socket.IO message queue or None
+    :type message_queue: class: `str` or None
+    :raises ValueError: If several workers have the in-process store or the shared store has no message queue
+    """
+    if workers > 1 and not shared:
+        raise ValueError('Several workers need a shared state store, set STATE_STORE to sqlite:///<path>')
+    if shared and not message_queue:
+        raise ValueError('A shared state store needs a message queue, set SOCKETIO_MESSAGE_QUEUE')
+
+
+store: StateStore = create_store(app.config['STATE_STORE'])
+check_deployment(app.config['WORKERS'], store.shared, os.environ.get('SOCKETIO_MESSAGE_QUEUE'))
+WORKER_ID: str = str(uuid.uuid4())
+waiting_players: WaitingQueue = WaitingQueue(
+    app.config['RATING_BAND'], app.config['RATING_WINDOW'], app.config['RATING_WINDOW_GROWTH'],
+    app.config['RATING_WINDOW_MAX'], app.config['MATCH_RELAX_AFTER'], app.config['QUEUE_STATS_SAMPLES'],
+    app.config['MATCH_AUGMENT_CANDIDATES'])
+queue_event: Event = Event()
+match_waiters: Dict[str, Event] = {}
+sweeper: Sweeper = Sweeper({'games': app.config['GAME_TTL'], 'queue': app.config['QUEUE_TTL'],
+                            'sessions': app.config['SESSION_TTL'], 'sids': app.config['SID_TTL']})
+history: HistoryWriter = HistoryWriter(app.config['HISTORY_QUEUE_SIZE'], app.config['HISTORY_BATCH_SIZE'],
+                                       write_history)
+stats_buffer: StatsBuffer = StatsBuffer(app.config['STATS_FLUSH_LIMIT'], write_stats)
+profiles: ProfileCache = ProfileCache(app.config['PROFILE_CACHE_SIZE'], app.config['PROFILE_CACHE_TTL'])
+leaderboard: Leaderboard = Leaderboard(app.config['LEADERBOARD_SIZE'])
+
+
+def match_players() -> int:
+    """
+    Pair all the players in the queue who can play with each other, create games for them and notify them.
+
+    :return: Number of created games
+    :rtype: class: `int`
+    """
+    created = []
+
+    for player1, player2 in waiting_players.pop_pairs():
+        with store.lock():
+            left = [player for player in (player1, player2) if store.get('queue', player['user_id']) is None]
+            if left:
+                for player in (player1, player2):
+                    if player not in left:
+                        waiting_players.push(player['user_id'], player['sign'], player['turn'], player['rating'],
+                                             player['time'])
+                continue
+
+            player1['username'] = store.pop('queue', player1['user_id'])['username']
+            player2['username'] = store.pop('queue', player2['user_id'])['username']
+            created.append((create_game(player1, player2), player1['user_id'], player2['user_id']))
+
+    for game_id, user1_id, user2_id in created:
+        notify_match(user1_id, user2_id, game_id)
+        notify_match(user2_id, user1_id, game_id)
+
+    return len(created)
+
+
+def create_game(player1: Dict, player2: Dict) -> str:
+    """
+    Create a game for two players.
+
+    :param player1: Queue entry of the longest waiting player, with the username added from the shared queue
+    :type player1: class: `dict`
+    :param player2: Queue entry of the other player, with the username added from the shared queue
+    :type player2: class: `dict`
+    :return: Id of the game
+    :rtype: class: `str`
+    """
+    game_id = str(uuid.uuid4())
+
+    sign1, sign2 = resolve_choices(player1['sign'], player2['sign'], ('X', 'O'))
+    turn1, _ = resolve_choices(player1['turn'], player2['turn'], ('1', '2'))
+
+    if turn1 == '1':
+        game = Game((player1['user_id'], player2['user_id']), sign1 + sign2,
+                    (player1['username'], player2['username']), time.time())
     else:
+        game = Game((player2['user_id'], player1['user_id']), sign2 + sign1,
+                    (player2['username'], player1['username']), time.time())
+
+    store.set('games', game_id, game)
+    sweeper.schedule('games', game_id, game.created)
+
+    store.set('user_games', player1['user_id'], game_id)
+    store.set('user_games', player2['user_id'], game_id)
+
+    return game_id
+
+
+def resolve_choices(first: str, second: str, options: Tuple[str, str]) -> Tuple[str, str]:
+    """
+    Give two players different values of a sign or of a turn.
+
+    A random choice takes the value left by the other player. If both choices are the same,
+    the first player keeps the choice.
+
+    :param first: Choice of the longest waiting player
+    :type first: class: `str`
+    :param second: Choice of the other player
+    :type second: class: `str`
+    :param options: The two possible values
+    :type options: class: `tuple[str, str]`
+    :return: Values of the first and of the second player
+    :rtype: class: `tuple[str, str]`
+    """
+    if first not in options:
+        if second in options:
+            first = options[1] if second == options[0] else options[0]
+        else:
+            first = random.choice(options)
+
+    return first, options[1] if first == options[0] else options[0]
+
+
+def notify_match(user_id: str, opponent_id: str, game_id: str) -> None:
+    """
+    Push the found game to the user subscribed to the search notifications.
+
+    :param user_id: Id of user
+    :type user_id: class: `str`
+    :param opponent_id: Id of the opponent
+    :type opponent_id: class: `str`
+    :param game_id: Id of the game
+    :type game_id: class: `str`
+    """
+    socketio.emit('match_found', {'opponent': opponent_id, 'game_id': game_id}, to=user_id, namespace='/search')
+    wake_waiter(user_id)
+
+
+def wake_waiter(user_id: str) -> None:
+    """
+    Release the long-poll request of the user waiting for the found game.
+
+    :param user_id: Id of user
+    :type user_id: class: `str`
+    """
+    waiter = match_waiters.pop(user_id, None)
+    if waiter is not None:
+        waiter.set()
+
+
+def find_game(user_id: str) -> Optional[Tuple[str, str]]:
+    """
+    Find the game that was created for the user.
+
+    :param user_id: Id of user
+    :type user_id: class: `str`
+    :return: Tuple of the game id and the opponent id or None
+    :rtype: class: `tuple[str, str]` or None
+    """
+    game_id = store.get('user_games', user_id)
+
+    if game_id is None:
         return None
 
+    return game_id, opponent_of(game_id, user_id)
 
-games: Dict[str, Dict[str, Dict[str, str]]] = {}
-users_dict: Dict[str, str] = {}
-waiting_players: List[Dict[str, str]] = []
-sessions: List[str] = []
+
+def opponent_of(game_id: str, user_id: str) -> str:
+    """
+    Get the opponent of the user in the game.
+
+    :param game_id: Id of the game
+    :type game_id: class: `str`
+    :param user_id: Id of user
+    :type user_id: class: `str`
+    :return: Id of the opponent
+    :rtype: class: `str`
+    """
+    return store.get('games', game_id).opponent(user_id)
+
+
+def is_queued(user_id: str) -> bool:
+    """
+    Check if the user is looking for a game.
+
+    :param user_id: Id of user
+    :type user_id: class: `str`
+    :return: True if the user is in the queue, otherwise False
+    :rtype: class: `bool`
+    """
+    return store.get('queue', user_id) is not None
+
+
+def load_queue(rebuild: bool) -> None:
+    """
+    Apply to the matcher queue the requests to join and to leave the queue made in any worker.
+
+    :param rebuild: Whether the matcher queue has to be rebuilt from the shared state,
+                    because the worker has just started running the matcher
+    :type rebuild: class: `bool`
+    """
+    changes = store.drain('queue')
+
+    if rebuild:
+        for user_id in waiting_players.users():
+            waiting_players.remove(user_id)
+        changes = [('push', entry) for _, entry in store.items('queue')]
+
+    for action, entry in changes:
+        if action == 'push':
+            waiting_players.push(entry['user_id'], entry['sign'], entry['turn'], entry['rating'], entry['joined'])
+        else:
+            waiting_players.remove(entry['user_id'])
+
+
+def run_matcher(leader: bool) -> bool:
+    """
+    Make one pass of the matcher if the worker holds the matcher lease.
+
+    :param leader: Whether the worker held the matcher lease at the previous pass
+    :type leader: class: `bool`
+    :return: Whether the worker holds the matcher lease
+    :rtype: class: `bool`
+    """
+    if not store.acquire('matcher', WORKER_ID, app.config['MATCHER_LEASE']):
+        return False
+
+    load_queue(not leader)
+    match_players()
+
+    return True
+
+
+def enqueue(user_id: str, username: str, sign: str, turn: str, rating: float, joined: float) -> None:
+    """
+    Add the user to the game search queue.
+
+    :param user_id: Id of user
+    :type user_id: class: `str`
+    :param username: Username of user, which is kept for the game record
+    :type username: class: `str`
+    :param sign: Sign chosen by the user, "X", "O" or "R" for random
+    :type sign: class: `str`
+    :param turn: Turn chosen by the user, "1", "2" or "0" for random
+    :type turn: class: `str`
+    :param rating: Rating of the user
+    :type rating: class: `float`
+    :param joined: Time when the user joined the queue
+    :type joined: class: `float`
+    """
+    entry = {'user_id': user_id, 'username': username, 'sign': sign, 'turn': turn, 'rating': rating,
+             'joined': joined}
+
+    with store.lock():
+        store.set('queue', user_id, entry)
+        store.push('queue', ('push', entry))
+    sweeper.schedule('queue', user_id, joined)
+    queue_event.set()
+
+
+def cancel_search(user_id: str) -> None:
+    """
+    Remove the user from the game search queue.
+
+    :param user_id: Id of user
+    :type user_id: class: `str`
+    """
+    if store.pop('queue', user_id) is not None:
+        store.push('queue', ('remove', {'user_id': user_id}))
+
+    queue_event.set()
+    wake_waiter(user_id)
 
 
 def start_game() -> None:
-    """Select two players in a separate thread to start the game."""
+    """
+    Select pairs of players in a background greenlet to start the games.
+
+    The greenlet sleeps until the queue changes or the rating window of some player grows.
+    Then it waits for one more tick to collect the players who join in a burst and pairs the whole queue at once.
+
+    With the shared state store only the worker holding the matcher lease pairs the players,
+    and it picks up the queue changes made by the other workers every `STATE_POLL_INTERVAL` seconds.
+
+    A pass that fails is logged, and the next pass rebuilds the matcher queue from the shared state,
+    so one bad pass does not stop the matchmaking.
+    """
+    leader = False
+
     while True:
-        length = len(waiting_players)
+        timeout = waiting_players.next_check()
+        if store.shared and (timeout is None or timeout > app.config['STATE_POLL_INTERVAL']):
+            timeout = app.config['STATE_POLL_INTERVAL']
 
-        flag = False
+        queue_event.wait(timeout)
+        socketio.sleep(app.config['MATCH_TICK'])
+        queue_event.clear()
 
-        for i in range(length):
-            player1 = waiting_players[i]
+        try:
+            leader = run_matcher(leader)
+        except Exception:  # pylint: disable=broad-except
+            app.logger.exception('Matcher pass failed')
+            leader = False
 
-            player1_sign = player1['sign']
-            player1_turn = player1['turn']
 
-            for j in range(length):
-                if i != j:
-                    if waiting_players[j]['sign'] != player1_sign and waiting_players[j]['turn'] != player1_turn:
-                        flag = True
-                        break
+def forfeit(game_id: str, user_id: str) -> None:
+    """
+    End the game that the user leaves, so that the user loses it if it is not over yet, and tell the opponent.
 
-            if flag:
-                break
+    :param game_id: Id of the game
+    :type game_id: class: `str`
+    :param user_id: Id of user
+    :type user_id: class: `str`
+    """
+    with store.lock():
+        game = store.get('games', game_id)
+        if game is None or game.over or user_id not in game.player_ids:
+            return
+        game.over = True
+        game.winner = game.opponent(user_id)
+        store.set('games', game_id, game)
+        store.pop('live', game_id)
+
+    opponent_id = game.opponent(user_id)
+    record_result(opponent_id, user_id, False)
+    archive_game(game_id, game, time.time())
+    broadcast_spectators(game, game_id, 'player_left', bytes((game.index(user_id),)))
+
+    opponent_sid = store.get('sids', opponent_id)
+    if opponent_sid is not None:
+        socketio.emit('opponent_reset', to=opponent_sid)
+
+
+def archive_game(game_id: str, game: Game, finished: float) -> None:
+    """
+    Put a finished game into the queue of the games written to the database.
+
+    :param game_id: Id of the game
+    :type game_id: class: `str`
+    :param game: Game record
+    :type game: class: `Game`
+    :param finished: Time when the game was finished
+    :type finished: class: `float`
+    """
+    forfeited = game.winner is not None and game.line(game.index(game.winner)) is None
 
-        if flag:
-            if j > i:
-                player2 = waiting_players.pop(j)
-                player1 = waiting_players.pop(i)
-            elif i > j:
-                player1 = waiting_players.pop(i)
-                player2 = waiting_players.pop(j)
+    history.push({'id': game_id, 'first_player_id': game.player_ids[0], 'second_player_id': game.player_ids[1],
+                  'signs': game.signs, 'winner_id': game.winner, 'forfeit': forfeited, 'created': game.created,
+                  'finished': finished},
+                 [{'game_id': game_id, 'number': number, 'square': square}
+                  for number, square in enumerate(game.history)])
 
-            game_id = str(uuid.uuid4())
 
-            if player1['turn'] == '1':
-                games[game_id] = {'player1': {'id': player1['user_id'], 'sign': player1['sign']},
-                                  'player2': {'id': player2['user_id'], 'sign': player2['sign']}}
-            else:
-                games[game_id] = {'player1': {'id': player2['user_id'], 'sign': player2['sign']},
-                                  'player2': {'id': player1['user_id'], 'sign': player1['sign']}}
+def broadcast_spectators(game: Game, game_id: str, event: str, data: bytes) -> None:
+    """
+    Send an event of the game to all its spectators.
+
+    The event is sent to the room of the game in the "/watch" namespace with one broadcast from a separate greenlet,
+    so the number of spectators does not delay the players.
+
+    :param game: Game record
+    :type game: class: `Game`
+    :param game_id: Id of the game
+    :type game_id: class: `str`
+    :param event: Name of the event
+    :type event: class: `str`
+    :param data: Data of the event encoded by the compact protocol
+    :type data: class: `bytes`
+    """
+    if game.spectators > 0:
+        socketio.start_background_task(socketio.emit, event, data, to=game_id, namespace='/watch')
 
-        time.sleep(5)
 
+def cancel_unready(game_id: str) -> None:
+    """
+    Cancel the game if the opponent of the first connected player does not connect in time.
 
-t: threading.Thread = threading.Thread(target=start_game, daemon=True)
-t.start()
+    The player who has not connected loses the game, and the other player is told that the opponent left it.
+    The greenlet runs outside of any request, so the result is recorded in its own application context.
+
+    :param game_id: Id of the game
+    :type game_id: class: `str`
+    """
+    socketio.sleep(app.config['READY_TIMEOUT'])
+
+    game = store.get('games', game_id)
+    if game is None or game.started or game.over:
+        return
+
+    absent_id = game.player_ids[0] if game.ready & 1 == 0 else game.player_ids[1]
+    with app.app_context():
+        forfeit(game_id, absent_id)
+
+    with store.lock():
+        if store.get('user_games', absent_id) == game_id:
+            store.pop('user_games', absent_id)
+
+
+def expire_away(game_id: str, user_id: str, away: str) -> None:
+    """
+    End the game of the user who has lost the connection if the user does not reconnect in time.
+
+    The greenlet runs outside of any request, so the game is ended in its own application context.
+
+    :param game_id: Id of the game
+    :type game_id: class: `str`
+    :param user_id: Id of user
+    :type user_id: class: `str`
+    :param away: Mark of the lost connection, which is removed when the user reconnects
+    :type away: class: `str`
+    """
+    socketio.sleep(app.config['RECONNECT_GRACE'])
+
+    with store.lock():
+        if store.get('away', user_id) != away:
+            return
+        store.pop('away', user_id)
+        if store.get('user_games', user_id) == game_id:
+            store.pop('user_games', user_id)
+
+    with app.app_context():
+        forfeit(game_id, user_id)
+        release_game(game_id, user_id)
+
+
+def release_game(game_id: str, user_id: str) -> None:
+    """
+    Mark the user as no longer connected to the game, and remove the game if no player is connected or linked to it.
+
+    :param game_id: Id of the game
+    :type game_id: class: `str`
+    :param user_id: Id of user
+    :type user_id: class: `str`
+    """
+    with store.lock():
+        game = store.get('games', game_id)
+        if game is None or user_id not in game.player_ids:
+            return
+
+        game.present &= ~(1 << game.index(user_id))
+        if game.present == 0 and all(store.get('user_games', player_id) != game_id for player_id in game.player_ids):
+            store.pop('games', game_id)
+        else:
+            store.set('games', game_id, game)
+
+
+def last_activity(table: str, key: str) -> Optional[float]:
+    """
+    Get the time of the last activity of a state entry.
+
+    A socket mapping is active while its user has a game.
+
+    :param table: Name of the state table
+    :type table: class: `str`
+    :param key: Key of the entry
+    :type key: class: `str`
+    :return: Time of the last activity, 0 for an orphaned socket mapping, or None if there is no such entry
+    :rtype: class: `float` or None
+    """
+    value = store.get(table, key)
+
+    if value is None:
+        return None
+    if table == 'games':
+        return value.updated
+    if table == 'queue':
+        return value.get('seen', value['joined'])
+    if table == 'sids':
+        return sweeper.clock() if store.get('user_games', key) is not None else 0.0
+    return value
+
+
+def evict(table: str, key: str) -> None:
+    """
+    Remove an abandoned state entry.
+
+    Together with a game the links of its players to it are removed, and a user leaves the queue
+    the same way as when the search is reset.
+
+    :param table: Name of the state table
+    :type table: class: `str`
+    :param key: Key of the entry
+    :type key: class: `str`
+    """
+    if table == 'queue':
+        cancel_search(key)
+        return
+
+    with store.lock():
+        value = store.pop(table, key)
+        if table == 'sids' and value is not None:
+            store.pop('sid_users', value)
+        if table == 'games' and value is not None:
+            store.pop('live', key)
+            for user_id in value.player_ids:
+                if store.get('user_games', user_id) == key:
+                    store.pop('user_games', user_id)
+                    sid = store.pop('sids', user_id)
+                    if sid is not None:
+                        store.pop('sid_users', sid)
+
+
+def sweep() -> int:
+    """
+    Check the state entries whose time has come and evict the ones that were not active.
+
+    :return: Number of evicted entries
+    :rtype: class: `int`
+    """
+    evicted = 0
+
+    for table, key in sweeper.due():
+        active = last_activity(table, key)
+        if active is None:
+            continue
+        if active + sweeper.ttls[table] > sweeper.clock():
+            sweeper.schedule(table, key, active)
+            continue
+
+        evict(table, key)
+        sweeper.evicted[table] += 1
+        evicted += 1
+
+    return evicted
+
+
+def run_sweeper() -> None:
+    """Evict the games, queue entries, sessions and socket mappings abandoned by crashed clients in a greenlet."""
+    while True:
+        timeout = sweeper.next_check()
+        socketio.sleep(app.config['SWEEP_INTERVAL'] if timeout is None else min(timeout, app.config['SWEEP_INTERVAL']))
+        sweep()
+
+
+def run_history_writer() -> None:
+    """
+    Write the finished games to the database in a greenlet.
+
+    A batch is written when `HISTORY_BATCH_SIZE` games are queued or `HISTORY_FLUSH_INTERVAL` seconds pass,
+    whichever comes first.
+    """
+    while True:
+        history.full.wait(app.config['HISTORY_FLUSH_INTERVAL'])
+        while history.flush() == history.batch_size:
+            socketio.sleep(0)
+
+
+def run_stats_flusher() -> None:
+    """Write the changes of the statistics to the database every `STATS_FLUSH_INTERVAL` seconds in a greenlet."""
+    while True:
+        socketio.sleep(app.config['STATS_FLUSH_INTERVAL'])
+        while stats_buffer.flush() == stats_buffer.limit:
+            socketio.sleep(0)
+
+
+def flush_history() -> None:
+    """Write all the queued games and the changes of the statistics to the database when the server stops."""
+    while history.flush():
+        pass
+    while stats_buffer.flush():
+        pass
+
+
+socketio.start_background_task(start_game)
+socketio.start_background_task(run_sweeper)
+socketio.start_background_task(run_history_writer)
+socketio.start_background_task(run_stats_flusher)
+atexit.register(flush_history)
+
+
+@app.before_request
+def touch_session() -> None:
+    """
+    Mark the session of the user as active, so that it is not evicted while the client is used.
+
+    The session is written to the state store only when half of its time to live has passed.
+    """
+    try:
+        user_id = jwt.decode(request.cookies['token'], app.secret_key, algorithms=['HS256'])['user_id']
+    except (KeyError, jwt.InvalidTokenError):
+        return
+
+    now = time.time()
+    with store.lock():
+        active = store.get('sessions', user_id)
+        if active is not None and now - active > app.config['SESSION_TTL'] / 2:
+            store.set('sessions', user_id, now)
 
 
 @app.route('/login', methods=['POST'])
@@ -187,25 +1030,17 @@ def login() -> flask.Response:
     username = data['username']
     password = data['password']
 
-    user_id = authenticate_user(username, password)
+    profile = authenticate_user(username, password)
 
-    if user_id:
-        if user_id in sessions:
+    if profile:
+        user_id = profile['user_id']
+        if not store.add('sessions', user_id, time.time()):
             return jsonify({'message': 'Error'})
+        sweeper.schedule('sessions', user_id)
 
         session['user_id'] = user_id
-        sessions.append(user_id)
         token = jwt.encode({'user_id': user_id}, app.secret_key, algorithm='HS256')
-        pc_stat = ComputerGameStat.query.filter_by(id=user_id).first()
-        friend_stat = OnlineGameStat.query.filter_by(id=user_id).first()
-        response = make_response(jsonify({'message': 'Login successful', 'user_id': user_id,
-                                          'pc_stat': {"drawn_game": pc_stat.games_draws,
-                                                      "Player_win": pc_stat.games_won,
-                                                      "Computer_win": pc_stat.games_defeat},
-                                          'friend_stat': {"drawn_game": friend_stat.games_draws,
-                                                          "Player1_win": friend_stat.games_won,
-                                                          "Player2_win": friend_stat.games_defeat}
-                                          }))
+        response = make_response(jsonify({'message': 'Login successful', **profile}))
         response.set_cookie('token', token, httponly=True, samesite='Strict')
         return response
     else:
@@ -220,7 +1055,7 @@ def logout() -> flask.Response:
     :return: Server response
     :rtype: class: `flask.Response`
     """
-    sessions.remove(session['user_id'])
+    store.pop('sessions', session['user_id'])
     session.pop('user_id', None)
     response = make_response(jsonify({'message': 'Logout successful'}))
     response.delete_cookie('token')
@@ -232,22 +1067,23 @@ def index() -> flask.Response:
     """
     Send the necessary data to the user when launching the client with the game.
 
+    The profile of the user is taken from the cache, and loaded from the database only if it is not there
+    or another worker has written the statistics of the user since it was cached.
+
     :return: Server response
     :rtype: class: `flask.Response`
     """
     print("yes")
     data = jwt.decode(request.cookies['token'], app.secret_key, algorithms=['HS256'])
     session['user_id'] = data['user_id']
-    user = User.query.filter_by(id=data['user_id']).first()
-    username = user.username
-    pc_stat = ComputerGameStat.query.filter_by(id=data['user_id']).first()
-    friend_stat = OnlineGameStat.query.filter_by(id=data['user_id']).first()
 
-    return jsonify({'message': 'Success', 'user': username,
-                    'pc_stat': {"drawn_game": pc_stat.games_draws, "Player_win": pc_stat.games_won,
-                                "Computer_win": pc_stat.games_defeat},
-                    'friend_stat': {"drawn_game": friend_stat.games_draws, "Player1_win": friend_stat.games_won,
-                                    "Player2_win": friend_stat.games_defeat}})
+    version = store.get('profile_versions', data['user_id']) or 0
+    profile = profiles.get(data['user_id'], version)
+    if profile is None:
+        profile = load_profile(User.id == data['user_id'])
+        profiles.put(data['user_id'], profile, version)
+
+    return jsonify({'message': 'Success', **profile})
 
 
 @app.route('/register', methods=['POST'])
@@ -269,143 +1105,243 @@ def register() -> flask.Response:
         return jsonify({'message': 'Username already exists'})
 
 
-@app.route('/update_computer_statistic', methods=['POST'])
-def update_computer_statistic() -> flask.Response:
+@app.route('/record_result', methods=['POST'])
+def record_computer_result() -> flask.Response:
     """
-    Update statistics of computer games of user.
+    Record the result of a game of the user with the computer.
+
+    The request has the "outcome" of the game for the user: "win", "draw" or "defeat".
 
     :return: Server response
     :rtype: class: `flask.Response`
     """
     token = jwt.decode(request.cookies['token'], app.secret_key, algorithms=['HS256'])
     user_id = token['user_id']
-    data = request.get_json()
-    games_played = data['games_played']
-    games_won = data['games_won']
-    games_draws = data['games_draws']
-    games_defeat = data['games_defeat']
-
-    user = ComputerGameStat.query.filter_by(id=user_id).first()
+    outcome = request.get_json().get('outcome')
 
-    user.games_played = games_played
-    user.games_won = games_won
-    user.games_draws = games_draws
-    user.games_defeat = games_defeat
+    if outcome not in OUTCOME_COLUMNS:
+        return jsonify({'message': 'Unknown outcome'})
 
-    db.session.commit()
+    count_result(ComputerGameStat, user_id, outcome)
 
-    return jsonify({'message': 'Game statistics updated successfully'})
+    return jsonify({'message': 'Game result recorded successfully'})
 
 
-@app.route('/update_friend_statistic', methods=['POST'])
-def update_friend_statistic() -> flask.Response:
+@app.route('/reset_search', methods=['GET'])
+def reset_search() -> flask.Response:
     """
-    Update statistics of online games of user.
+    Reset the game search.
 
     :return: Server response
     :rtype: class: `flask.Response`
     """
     token = jwt.decode(request.cookies['token'], app.secret_key, algorithms=['HS256'])
     user_id = token['user_id']
-    data = request.get_json()
-    games_played = data['games_played']
-    games_won = data['games_won']
-    games_draws = data['games_draws']
-    games_defeat = data['games_defeat']
-
-    user = OnlineGameStat.query.filter_by(id=user_id).first()
 
-    user.games_played = games_played
-    user.games_won = games_won
-    user.games_draws = games_draws
-    user.games_defeat = games_defeat
-
-    db.session.commit()
+    cancel_search(user_id)
 
-    return jsonify({'message': 'Game statistics updated successfully'})
+    return jsonify({'message': 'Success search reset'})
 
 
-@app.route('/reset_search', methods=['GET'])
-def reset_search() -> flask.Response:
+@socketio.on('connect', namespace='/search')
+def on_search_connect(*args) -> None:
     """
-    Reset the game search.
+    Subscribe the user to the notification about the found game.
 
-    :return: Server response
-    :rtype: class: `flask.Response`
+    If the game was found before the subscription, it is pushed to the user at once.
     """
     token = jwt.decode(request.cookies['token'], app.secret_key, algorithms=['HS256'])
     user_id = token['user_id']
-    for elem in waiting_players:
-        if elem['user_id'] == user_id:
-            waiting_players.remove(elem)
-            break
 
-    return jsonify({'message': 'Success search reset'})
+    join_room(user_id)
+
+    if not is_queued(user_id):
+        found = find_game(user_id)
+        if found is not None:
+            emit('match_found', {'opponent': found[1], 'game_id': found[0]})
 
 
 @socketio.on('connect')
-def on_connect(*args) -> None:
-    """Connect the user to the game."""
-    game_id = request.args.get('game_id')
-    user_id = request.args.get('user_id')
+def on_connect(*args) -> Optional[bool]:
+    """
+    Connect the user to the game.
 
-    users_dict[user_id] = request.sid
+    When the second player connects, both players are told to start the game. If the opponent does not connect
+    in `READY_TIMEOUT` seconds after the first player, the game is cancelled.
 
-    join_room(game_id)
+    A player who reconnects to a started game gets the list of the moves made to resume the game,
+    and the opponent is told that the player is back.
 
-    if user_id == games[game_id]['player1']['id']:
-        user = User.query.filter_by(id=games[game_id]['player2']['id']).first()
-        emit('info', {"message": "Your turn", "sign": games[game_id]['player1']['sign'],
-                      "opponent": user.username, "opponent_id": games[game_id]['player2']['id'],
-                      "opponent_sign": games[game_id]['player2']['sign']},
-             room=game_id, to=users_dict[user_id])
-    elif user_id == games[game_id]['player2']['id']:
-        user = User.query.filter_by(id=games[game_id]['player1']['id']).first()
-        emit('info', {"message": "Not your turn", "sign": games[game_id]['player2']['sign'],
-                      "opponent": user.username, "opponent_id": games[game_id]['player1']['id'],
-                      "opponent_sign": games[game_id]['player1']['sign']},
-             room=game_id, to=users_dict[user_id])
+    The "protocol=binary" parameter of the connection chooses the compact protocol of the game events,
+    which is confirmed in the "info" message.
 
+    The user is taken from the token cookie, so the socket id is linked only to the user who owns the token.
 
-@socketio.on('check_opponent')
-def check_opponent(data: Dict[str, str]) -> None:
+    :return: False if the token is missing or the user has no game, so the connection is rejected
+    :rtype: class: `bool` or None
     """
-    Check if the opponent is in the game.
+    try:
+        user_id = jwt.decode(request.cookies['token'], app.secret_key, algorithms=['HS256'])['user_id']
+    except (KeyError, jwt.InvalidTokenError):
+        return False
+    game_id = store.get('user_games', user_id)
+
+    if game_id is None:
+        return False
+
+    with store.lock():
+        old_sid = store.get('sids', user_id)
+        if old_sid is not None:
+            store.pop('sid_users', old_sid)
+        store.set('sids', user_id, request.sid)
+        store.set('sid_users', request.sid, user_id)
+    sweeper.schedule('sids', user_id)
 
-    Tell the user that it is possible to start the game, or tells the user that the opponent reset the game.
+    join_room(game_id)
 
-    :param data: Dictionary with game parameters
-    :type data: class: `dict[str, str]`
+    with store.lock():
+        store.pop('away', user_id)
+        game = store.get('games', game_id)
+        number = game.index(user_id)
+        first = game.ready == 0
+        resume = game.started
+        game.ready |= 1 << number
+        game.present |= 1 << number
+        if request.args.get('protocol') == 'binary':
+            game.binary |= 1 << number
+        else:
+            game.binary &= ~(1 << number)
+        start = game.ready == 3 and not game.started
+        game.started = game.started or start
+        store.set('games', game_id, game)
+
+    emit('info', {"message": "Your turn" if number == 0 else "Not your turn", "sign": game.signs[number],
+                  "opponent": game.usernames[1 - number], "opponent_id": game.player_ids[1 - number],
+                  "opponent_sign": game.signs[1 - number],
+                  "protocol": "binary" if game.binary >> number & 1 else "json"},
+         room=game_id, to=request.sid)
+
+    if resume:
+        emit('resume', game.history if game.binary >> number & 1 else {'moves': list(game.history)}, to=request.sid)
+        opponent_sid = store.get('sids', game.player_ids[1 - number])
+        if opponent_sid is not None and not game.over:
+            emit('opponent_back', to=opponent_sid)
+
+    if game.over and (game.moves == 9 or game.line(1 - number) is not None):
+        emit('update_game_over', game_over_message(game, number), to=request.sid)
+    elif game.over:
+        emit('opponent_reset', to=request.sid)
+    elif start:
+        store.set('live', game_id, (game.usernames, game.signs))
+        emit('start_game', to=game_id)
+    elif first:
+        socketio.start_background_task(cancel_unready, game_id)
+
+    return None
+
+
+@socketio.on('disconnect')
+def on_disconnect(*args) -> None:
     """
-    game_id = data['game_id']
-    user_id = data['user_id']
-    opponent_id = data['opponent_id']
+    Release the game of the user whose connection is lost.
 
-    if opponent_id not in users_dict:
-        emit('opponent_reset', room=game_id, to=users_dict[user_id])
+    The user is found by the socket id. If the game is running, the opponent is told at once, and the user
+    can reconnect in `RECONNECT_GRACE` seconds to resume the game, otherwise the user loses it.
+    """
+    user_id = store.pop('sid_users', request.sid)
+
+    if user_id is None:
+        return
+
+    away = str(uuid.uuid4())
+
+    with store.lock():
+        if store.get('sids', user_id) != request.sid:
+            return
+        store.pop('sids', user_id)
+        game_id = store.get('user_games', user_id)
+        game = None if game_id is None else store.get('games', game_id)
+        running = game is not None and game.started and not game.over
+        if running:
+            store.set('away', user_id, away)
+        elif game_id is not None:
+            store.pop('user_games', user_id)
+
+    if game_id is None:
+        return
+
+    if running:
+        release_game(game_id, user_id)
+        opponent_sid = store.get('sids', game.opponent(user_id))
+        if opponent_sid is not None:
+            emit('opponent_away', to=opponent_sid)
+        socketio.start_background_task(expire_away, game_id, user_id, away)
     else:
-        emit('start_game', room=game_id, to=users_dict[opponent_id])
+        forfeit(game_id, user_id)
+        release_game(game_id, user_id)
 
 
 @socketio.on('play')
-def on_play(data: Dict[str, Union[str, int]]) -> None:
+def on_play(data: Union[Dict[str, Union[str, int]], bytes]) -> None:
     """
-    Inform the opponent about the user's progress.
+    Make the user's move and inform the opponent about it.
 
-    :param data: Dictionary with game parameters
-    :type data: class: `dict[str, str | int]`
-    """
-    game_id = data['game_id']
-    pos = data['pos']
-    user_id = data['user_id']
-    opponent_id = data['opponent_id']
+    The move is checked against the game board kept by the server, and out of turn or repeated moves are ignored,
+    as well as moves whose sequence number, the number of the moves made before, does not match the game.
+    If the move ends the game, both players get the result, and it is recorded in their statistics.
+    An opponent who has lost the connection gets the move when reconnecting.
 
-    users = list(socketio.server.manager.rooms['/'][game_id])
+    With the compact protocol the move is one byte made by `encode_move`, and a payload of another length
+    is ignored. With both protocols the user is found by the socket id, so a client can move only for its own user.
 
-    if len(users) == 1:
-        emit('opponent_reset', room=game_id, to=users_dict[user_id])
+    :param data: Dictionary with game parameters or the encoded move
+    :type data: class: `dict[str, str | int]` or `bytes`
+    """
+    user_id = store.get('sid_users', request.sid)
+    if isinstance(data, bytes):
+        if len(data) != 1:
+            return
+        seq, pos = data[0] >> 4, data[0] & 0xF
+    else:
+        seq, pos = data.get('seq'), data['pos']
+    game_id = None if user_id is None else store.get('user_games', user_id)
+
+    if game_id is None:
+        return
+
+    with store.lock():
+        game = store.get('games', game_id)
+        if game is None or seq not in (None, game.moves):
+            return
+        try:
+            line = game.play(user_id, pos, time.time())
+        except ValueError:
+            return
+        store.set('games', game_id, game)
+
+    opponent_id = game.opponent(user_id)
+    seq = game.moves - 1
+
+    if game.over:
+        store.pop('live', game_id)
+        record_result(user_id, opponent_id, line is None)
+        archive_game(game_id, game, game.updated)
+        for number, player_id in enumerate(game.player_ids):
+            sid = store.get('sids', player_id)
+            if sid is not None:
+                emit('update_game_over', game_over_message(game, number), to=sid)
+        broadcast_spectators(game, game_id, 'update_game_over',
+                             encode_game_over(seq, pos, None if line is None else game.index(user_id), line))
+        return
+
+    broadcast_spectators(game, game_id, 'update_board', encode_move(seq, pos))
+
+    if not game.present >> game.index(opponent_id) & 1:
+        return
+    if game.binary >> game.index(opponent_id) & 1:
+        emit('update_board', encode_move(seq, pos), to=store.get('sids', opponent_id))
     else:
-        emit('update_board', {"pos": pos}, room=game_id, to=users_dict[opponent_id])
+        emit('update_board', {"pos": pos}, room=game_id, to=store.get('sids', opponent_id))
 
 
 @socketio.on('leave')
@@ -413,40 +1349,23 @@ def leave(data: Dict[str, str]) -> None:
     """
     Exit the game at the end of it.
 
+    The user is found by the socket id.
+
     :param data: Dictionary with game parameters
     :type data: class: `dict[str, str]`
     """
     game_id = data['game_id']
-    user_id = data['user_id']
-    if len(socketio.server.manager.rooms['/'][game_id]) == 1:
-        games.pop(game_id)
+    user_id = store.pop('sid_users', request.sid)
     leave_room(game_id)
-    leave_room(users_dict[user_id])
+    leave_room(request.sid)
     leave_room(None)
-    users_dict.pop(user_id)
-
-
-@socketio.on('game_over')
-def game_over(data: Dict[str, Union[str, bool, int]]) -> None:
-    """
-    Tell the opponent that the game is over.
-
-    :param data: Dictionary with game parameters
-    :type data: class: `dict[str, str | bool | int]`
-    """
-    game_id = data['game_id']
-    is_draw = data['is_draw']
-    opponent_id = data['opponent_id']
-    pos = data['pos']
-
-    if not is_draw:
-        pos_a = data['a']
-        pos_b = data['b']
-        pos_c = data['c']
-        emit('update_game_over', {'is_draw': is_draw, 'a': pos_a, 'b': pos_b, 'c': pos_c, 'pos': pos},
-             room=game_id, to=users_dict[opponent_id])
-    else:
-        emit('update_game_over', {'is_draw': is_draw, 'pos': pos}, room=game_id, to=users_dict[opponent_id])
+    if user_id is None:
+        return
+    store.pop('sids', user_id)
+    with store.lock():
+        if store.get('user_games', user_id) == game_id:
+            store.pop('user_games', user_id)
+    release_game(game_id, user_id)
 
 
 @socketio.on('reset_game')
@@ -454,18 +1373,92 @@ def reset_game(data: Dict[str, str]) -> None:
     """
     Cancel the game for the user.
 
+    If the game is not over yet, the user loses it. The user is found by the socket id,
+    and the game by the link of the user to it.
+
     :param data: Dictionary with game parameters
     :type data: class: `dict[str, str]`
     """
-    game_id = data['game_id']
-    user_id = data['user_id']
-    opponent_id = data['opponent_id']
+    user_id = store.pop('sid_users', request.sid)
+    game_id = None if user_id is None else store.pop('user_games', user_id)
 
-    emit('opponent_reset', room=game_id, to=users_dict[opponent_id])
-    leave_room(game_id)
-    leave_room(users_dict[user_id])
+    if game_id is not None:
+        forfeit(game_id, user_id)
+        release_game(game_id, user_id)
+
+    leave_room(data['game_id'])
+    leave_room(request.sid)
     leave_room(None)
-    users_dict.pop(user_id)
+    if user_id is not None:
+        store.pop('sids', user_id)
+
+
+@socketio.on('connect', namespace='/watch')
+def on_watch_connect(*args) -> Optional[bool]:
+    """
+    Connect a spectator to the game given by the "game_id" parameter of the connection.
+
+    The spectator gets the snapshot of the game with the players, their signs, the moves made in the game
+    as one byte per move, and the result if the game is over. Then the spectator gets the events of the game
+    in the compact protocol.
+
+    :return: False if there is no such game, so the connection is rejected
+    :rtype: class: `bool` or None
+    """
+    game_id = request.args.get('game_id')
+
+    with store.lock():
+        game = store.get('games', game_id)
+        if game is None or not game.started:
+            return False
+        game.spectators += 1
+        store.set('games', game_id, game)
+        store.set('watchers', request.sid, game_id)
+
+    join_room(game_id)
+
+    emit('snapshot', {'players': list(game.usernames), 'signs': game.signs, 'moves': game.history,
+                      'over': game.over, 'winner': None if game.winner is None else game.index(game.winner),
+                      'spectators': game.spectators})
+
+    return None
+
+
+@socketio.on('disconnect', namespace='/watch')
+def on_watch_disconnect(*args) -> None:
+    """Disconnect a spectator from the game."""
+    game_id = store.pop('watchers', request.sid)
+
+    if game_id is None:
+        return
+
+    with store.lock():
+        game = store.get('games', game_id)
+        if game is not None:
+            game.spectators -= 1
+            store.set('games', game_id, game)
+
+
+@app.route('/live_games', methods=['GET'])
+def live_games() -> flask.Response:
+    """
+    Send the list of the running games that can be watched.
+
+    The "limit" parameter sets the maximal number of the games in the list, up to `LIVE_GAMES_LIMIT`.
+
+    :return: Server response
+    :rtype: class: `flask.Response`
+    """
+    limit = min(max(request.args.get('limit', app.config['LIVE_GAMES_LIMIT'], type=int), 0),
+                app.config['LIVE_GAMES_LIMIT'])
+    games = []
+
+    for game_id, (usernames, signs) in store.items('live', limit):
+        game = store.get('games', game_id)
+        games.append({'game_id': game_id, 'players': list(usernames), 'signs': signs,
+                      'spectators': 0 if game is None else game.spectators})
+
+    return jsonify({'message': 'Success', 'games': games})
 
 
 @app.route('/is_game_searched', methods=['GET'])
@@ -473,24 +1466,37 @@ def is_game_searched() -> flask.Response:
     """
     Tell if a game has been found for the user.
 
+    With the "wait" parameter the request is held for up to that many seconds while the user is still in the queue,
+    and it is answered as soon as the game is found or the search is reset. With the shared state store the game
+    can be found by another worker, so the queue is also checked every `STATE_POLL_INTERVAL` seconds.
+
     :return: Server response
     :rtype: class: `flask.Response`
     """
     data = jwt.decode(request.cookies['token'], app.secret_key, algorithms=['HS256'])
     user_id = data['user_id']
+    wait = min(request.args.get('wait', 0, type=float), app.config['SEARCH_WAIT_LIMIT'])
+
+    with store.lock():
+        entry = store.get('queue', user_id)
+        if entry is not None:
+            entry['seen'] = time.time()
+            store.set('queue', user_id, entry)
+
+    if wait > 0:
+        deadline = time.time() + wait
+        waiter = match_waiters.setdefault(user_id, Event())
+        while is_queued(user_id) and time.time() < deadline:
+            if waiter.wait(min(deadline - time.time(), app.config['STATE_POLL_INTERVAL']) if store.shared
+                           else deadline - time.time()):
+                break
+        if match_waiters.get(user_id) is waiter:
+            match_waiters.pop(user_id)
 
-    flag = False
-
-    for elem in waiting_players:
-        if elem['user_id'] == user_id:
-            flag = True
-
-    if not flag:
-        for key, elem in games.items():
-            if elem['player1']['id'] == user_id:
-                return jsonify({'message': 'Success', 'opponent': elem['player2']['id'], 'game_id': key})
-            elif elem['player2']['id'] == user_id:
-                return jsonify({'message': 'Success', 'opponent': elem['player1']['id'], 'game_id': key})
+    if not is_queued(user_id):
+        found = find_game(user_id)
+        if found is not None:
+            return jsonify({'message': 'Success', 'opponent': found[1], 'game_id': found[0]})
 
     return jsonify({'message': 'Game is not searched yet'})
 
@@ -506,16 +1512,112 @@ def join_queue() -> flask.Response:
     token = jwt.decode(request.cookies['token'], app.secret_key, algorithms=['HS256'])
     user_id = token['user_id']
     data = request.get_json()
-    if data['sign'] == 'R':
-        data['sign'] = random.choice(['X', 'O'])
 
-    if data['turn'] == '0':
-        data['turn'] = random.choice(['1', '2'])
+    if data.get('sign') not in WaitingQueue.signs or data.get('turn') not in WaitingQueue.turns:
+        return jsonify({'message': 'Invalid sign or turn'})
+
+    username, rating = db.session.query(User.username, OnlineGameStat.rating).join(
+        OnlineGameStat, OnlineGameStat.id == User.id).filter(User.id == user_id).one()
+
+    rating += stats_buffer.pending(OnlineGameStat, user_id).get('rating', 0.0)
 
-    waiting_players.append({'user_id': user_id, 'sign': data['sign'], 'turn': data['turn']})
+    enqueue(user_id, username, data['sign'], data['turn'], rating, time.time())
 
     return jsonify({'message': 'Success'})
 
 
+@app.route('/leaderboard', methods=['GET'])
+def leaderboard_page() -> flask.Response:
+    """
+    Send a page of the users ordered by their ratings.
+
+    The "limit" parameter sets the number of users on the page, up to `LEADERBOARD_PAGE`. The next page starts
+    after the user whose id is given by the "after" parameter, and the "rank" parameter is the place of that user.
+    Pages of the top of `LEADERBOARD_SIZE` users are taken from memory, and the pages below it are loaded
+    by the index on the rating. The top is loaded again when another worker has written ratings since.
+
+    :return: Server response
+    :rtype: class: `flask.Response`
+    """
+    limit = min(max(request.args.get('limit', app.config['LEADERBOARD_PAGE'], type=int), 1),
+                app.config['LEADERBOARD_PAGE'])
+    after = request.args.get('after')
+    rank = request.args.get('rank', 0, type=int)
+
+    version = store.get('versions', 'ratings') or 0
+    if not leaderboard.current(version):
+        leaderboard.load(load_top(leaderboard.size), version)
+
+    users = leaderboard.page(after, limit)
+    if users is None:
+        row = db.session.get(OnlineGameStat, after)
+        users = [] if row is None else load_ranking(limit, (row.rating, after))
+    elif len(users) < limit and leaderboard.full():
+        last = (users[-1][2], users[-1][0]) if users else (leaderboard.rating(after), after)
+        users += load_ranking(limit - len(users), last)
+
+    return jsonify({'message': 'Success',
+                    'players': [{'place': rank + number, 'user_id': user_id, 'user': username, 'rating': round(rating)}
+                                for number, (user_id, username, rating) in enumerate(users, 1)],
+                    'next': users[-1][0] if len(users) == limit else None})
+
+
+@app.route('/eviction_stats', methods=['GET'])
+def eviction_stats() -> flask.Response:
+    """
+    Send the numbers of the abandoned state entries evicted by this worker.
+
+    :return: Server response
+    :rtype: class: `flask.Response`
+    """
+    return jsonify({'message': 'Success', **sweeper.stats()})
+
+
+@app.route('/history_stats', methods=['GET'])
+def history_stats() -> flask.Response:
+    """
+    Send the statistics of the queue of the finished games written to the database by this worker.
+
+    :return: Server response
+    :rtype: class: `flask.Response`
+    """
+    return jsonify({'message': 'Success', **history.stats()})
+
+
+@app.route('/stats_buffer', methods=['GET'])
+def stats_buffer_stats() -> flask.Response:
+    """
+    Send the statistics of the buffer of the changes of the game statistics kept by this worker.
+
+    :return: Server response
+    :rtype: class: `flask.Response`
+    """
+    return jsonify({'message': 'Success', **stats_buffer.stats()})
+
+
+@app.route('/profile_cache_stats', methods=['GET'])
+def profile_cache_stats() -> flask.Response:
+    """
+    Send the statistics of the cache of the profiles of users kept by this worker.
+
+    :return: Server response
+    :rtype: class: `flask.Response`
+    """
+    return jsonify({'message': 'Success', **profiles.stats()})
+
+
+@app.route('/queue_stats', methods=['GET'])
+def queue_stats() -> flask.Response:
+    """
+    Send the statistics of the game search queue.
+
+    With several workers the statistics are kept by the worker that runs the matcher.
+
+    :return: Server response
+    :rtype: class: `flask.Response`
+    """
+    return jsonify({'message': 'Success', **waiting_players.stats()})
+
+
 if __name__ == '__main__':
     socketio.run(app)
@@ -0,0 +1,443 @@
+"""Stores of the server state shared by the request handlers of one or of several server workers."""
+
+import time
+import pickle
+import itertools
+import sqlite3
+import threading
+from abc import ABC, abstractmethod
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+
+class StateStore(ABC):
+    """
+    Base class of the server state stores.
+
+    The state is kept in named tables of keys and values and in named journals, which are lists
+    that are appended to by any worker and drained by one of them.
+    """
+
+    shared: bool = False
+
+    @contextmanager
+    @abstractmethod
+    def lock(self) -> Iterator[None]:
+        """
+        Make the operations inside the block atomic.
+
+        :return: Context manager of the block
+        :rtype: class: `Iterator[None]`
+        """
+
+    @abstractmethod
+    def get(self, table: str, key: str) -> Any:
+        """
+        Get a value from the table.
+
+        :param table: Name of the table
+        :type table: class: `str`
+        :param key: Key of the value
+        :type key: class: `str`
+        :return: Value or None if there is no such key
+        :rtype: class: `Any`
+        """
+
+    @abstractmethod
+    def set(self, table: str, key: str, value: Any) -> None:
+        """
+        Put a value into the table.
+
+        :param table: Name of the table
+        :type table: class: `str`
+        :param key: Key of the value
+        :type key: class: `str`
+        :param value: Value
+        :type value: class: `Any`
+        """
+
+    def add(self, table: str, key: str, value: Any) -> bool:
+        """
+        Put a value into the table if there is no such key yet.
+
+        :param table: Name of the table
+        :type table: class: `str`
+        :param key: Key of the value
+        :type key: class: `str`
+        :param value: Value
+        :type value: class: `Any`
+        :return: True if the value was put, otherwise False
+        :rtype: class: `bool`
+        """
+        with self.lock():
+            if self.get(table, key) is not None:
+                return False
+            self.set(table, key, value)
+            return True
+
+    @abstractmethod
+    def pop(self, table: str, key: str) -> Any:
+        """
+        Remove a value from the table.
+
+        :param table: Name of the table
+        :type table: class: `str`
+        :param key: Key of the value
+        :type key: class: `str`
+        :return: Removed value or None if there was no such key
+        :rtype: class: `Any`
+        """
+
+    @abstractmethod
+    def items(self, table: str, limit: Optional[int] = None) -> List[Tuple[str, Any]]:
+        """
+        Get the keys and values of the table.
+
+        :param table: Name of the table
+        :type table: class: `str`
+        :param limit: Maximal number of the keys and values, defaults to None for all of them
+        :type limit: class: `int` or None
+        :return: List of keys and values
+        :rtype: class: `list[tuple[str, Any]]`
+        """
+
+    @abstractmethod
+    def push(self, journal: str, value: Any) -> None:
+        """
+        Append a value to the journal.
+
+        :param journal: Name of the journal
+        :type journal: class: `str`
+        :param value: Value
+        :type value: class: `Any`
+        """
+
+    @abstractmethod
+    def drain(self, journal: str) -> List[Any]:
+        """
+        Take all values from the journal in the order they were appended.
+
+        :param journal: Name of the journal
+        :type journal: class: `str`
+        :return: List of values
+        :rtype: class: `list[Any]`
+        """
+
+    @abstractmethod
+    def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        """
+        Acquire or renew a lease, so that only one worker does some job.
+
+        :param name: Name of the lease
+        :type name: class: `str`
+        :param owner: Id of the worker
+        :type owner: class: `str`
+        :param ttl: Number of seconds the lease is valid for if it is not renewed
+        :type ttl: class: `float`
+        :return: True if the worker holds the lease, otherwise False
+        :rtype: class: `bool`
+        """
+
+
+class InProcessStore(StateStore):
+    """
+    State store kept in the memory of a single server worker.
+
+    Values are stored as they are, so a changed value must still be put back with `set`
+    to keep the code working with the shared store.
+    """
+
+    def __init__(self) -> None:
+        """Make constructor method."""
+        self._tables: Dict[str, Dict[str, Any]] = defaultdict(dict)
+        self._journals: Dict[str, List[Any]] = defaultdict(list)
+        self._lock: threading.RLock = threading.RLock()
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        """
+        Make the operations inside the block atomic.
+
+        :return: Context manager of the block
+        :rtype: class: `Iterator[None]`
+        """
+        with self._lock:
+            yield
+
+    def get(self, table: str, key: str) -> Any:
+        """
+        Get a value from the table.
+
+        :param table: Name of the table
+        :type table: class: `str`
+        :param key: Key of the value
+        :type key: class: `str`
+        :return: Value or None if there is no such key
+        :rtype: class: `Any`
+        """
+        return self._tables[table].get(key)
+
+    def set(self, table: str, key: str, value: Any) -> None:
+        """
+        Put a value into the table.
+
+        :param table: Name of the table
+        :type table: class: `str`
+        :param key: Key of the value
+        :type key: class: `str`
+        :param value: Value
+        :type value: class: `Any`
+        """
+        self._tables[table][key] = value
+
+    def pop(self, table: str, key: str) -> Any:
+        """
+        Remove a value from the table.
+
+        :param table: Name of the table
+        :type table: class: `str`
+        :param key: Key of the value
+        :type key: class: `str`
+        :return: Removed value or None if there was no such key
+        :rtype: class: `Any`
+        """
+        return self._tables[table].pop(key, None)
+
+    def items(self, table: str, limit: Optional[int] = None) -> List[Tuple[str, Any]]:
+        """
+        Get the keys and values of the table.
+
+        :param table: Name of the table
+        :type table: class: `str`
+        :param limit: Maximal number of the keys and values, defaults to None for all of them
+        :type limit: class: `int` or None
+        :return: List of keys and values
+        :rtype: class: `list[tuple[str, Any]]`
+        """
+        with self._lock:
+            return list(itertools.islice(self._tables[table].items(), limit))
+
+    def push(self, journal: str, value: Any) -> None:
+        """
+        Append a value to the journal.
+
+        :param journal: Name of the journal
+        :type journal: class: `str`
+        :param value: Value
+        :type value: class: `Any`
+        """
+        with self._lock:
+            self._journals[journal].append(value)
+
+    def drain(self, journal: str) -> List[Any]:
+        """
+        Take all values from the journal in the order they were appended.
+
+        :param journal: Name of the journal
+        :type journal: class: `str`
+        :return: List of values
+        :rtype: class: `list[Any]`
+        """
+        with self._lock:
+            values = self._journals[journal]
+            self._journals[journal] = []
+            return values
+
+    def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        """
+        Acquire or renew a lease, so that only one worker does some job.
+
+        There is only one worker, so the lease is always acquired.
+
+        :param name: Name of the lease
+        :type name: class: `str`
+        :param owner: Id of the worker
+        :type owner: class: `str`
+        :param ttl: Number of seconds the lease is valid for if it is not renewed
+        :type ttl: class: `float`
+        :return: True
+        :rtype: class: `bool`
+        """
+        return True
+
+
+class SQLiteStore(StateStore):
+    """
+    State store kept in a SQLite database in WAL mode, shared by the server workers on one machine.
+
+    Values are pickled, and every operation or block of operations is a separate transaction.
+
+    :param path: Path to the database file
+    :type path: class: `str`
+    """
+
+    shared: bool = True
+
+    def __init__(self, path: str) -> None:
+        """Make constructor method."""
+        self._connection: sqlite3.Connection = sqlite3.connect(path, timeout=5, isolation_level=None,
+                                                               check_same_thread=False)
+        self._connection.execute('PRAGMA journal_mode=WAL')
+        self._connection.execute('PRAGMA synchronous=NORMAL')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS state (tab TEXT NOT NULL, key TEXT NOT NULL, '
+                                 'value BLOB NOT NULL, PRIMARY KEY (tab, key)) WITHOUT ROWID')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS journal (id INTEGER PRIMARY KEY AUTOINCREMENT, '
+                                 'name TEXT NOT NULL, value BLOB NOT NULL)')
+        self._connection.execute('CREATE INDEX IF NOT EXISTS journal_name ON journal (name, id)')
+        self._connection.execute('CREATE TABLE IF NOT EXISTS lease (name TEXT PRIMARY KEY, owner TEXT NOT NULL, '
+                                 'expires REAL NOT NULL)')
+        self._lock: threading.RLock = threading.RLock()
+        self._depth: int = 0
+
+    @contextmanager
+    def lock(self) -> Iterator[None]:
+        """
+        Make the operations inside the block one transaction.
+
+        :return: Context manager of the block
+        :rtype: class: `Iterator[None]`
+        """
+        with self._lock:
+            if self._depth == 0:
+                self._connection.execute('BEGIN IMMEDIATE')
+            self._depth += 1
+            try:
+                yield
+            except BaseException:
+                self._depth -= 1
+                if self._depth == 0:
+                    self._connection.execute('ROLLBACK')
+                raise
+            self._depth -= 1
+            if self._depth == 0:
+                self._connection.execute('COMMIT')
+
+    def get(self, table: str, key: str) -> Any:
+        """
+        Get a value from the table.
+
+        :param table: Name of the table
+        :type table: class: `str`
+        :param key: Key of the value
+        :type key: class: `str`
+        :return: Value or None if there is no such key
+        :rtype: class: `Any`
+        """
+        with self._lock:
+            row = self._connection.execute('SELECT value FROM state WHERE tab = ? AND key = ?',
+                                           (table, key)).fetchone()
+        return None if row is None else pickle.loads(row[0])
+
+    def set(self, table: str, key: str, value: Any) -> None:
+        """
+        Put a value into the table.
+
+        :param table: Name of the table
+        :type table: class: `str`
+        :param key: Key of the value
+        :type key: class: `str`
+        :param value: Value
+        :type value: class: `Any`
+        """
+        with self._lock:
+            self._connection.execute('INSERT OR REPLACE INTO state (tab, key, value) VALUES (?, ?, ?)',
+                                     (table, key, pickle.dumps(value)))
+
+    def pop(self, table: str, key: str) -> Any:
+        """
+        Remove a value from the table.
+
+        :param table: Name of the table
+        :type table: class: `str`
+        :param key: Key of the value
+        :type key: class: `str`
+        :return: Removed value or None if there was no such key
+        :rtype: class: `Any`
+        """
+        with self.lock():
+            value = self.get(table, key)
+            self._connection.execute('DELETE FROM state WHERE tab = ? AND key = ?', (table, key))
+        return value
+
+    def items(self, table: str, limit: Optional[int] = None) -> List[Tuple[str, Any]]:
+        """
+        Get the keys and values of the table.
+
+        :param table: Name of the table
+        :type table: class: `str`
+        :param limit: Maximal number of the keys and values, defaults to None for all of them
+        :type limit: class: `int` or None
+        :return: List of keys and values
+        :rtype: class: `list[tuple[str, Any]]`
+        """
+        with self._lock:
+            rows = self._connection.execute('SELECT key, value FROM state WHERE tab = ? LIMIT ?',
+                                            (table, -1 if limit is None else limit)).fetchall()
+        return [(key, pickle.loads(value)) for key, value in rows]
+
+    def push(self, journal: str, value: Any) -> None:
+        """
+        Append a value to the journal.
+
+        :param journal: Name of the journal
+        :type journal: class: `str`
+        :param value: Value
+        :type value: class: `Any`
+        """
+        with self._lock:
+            self._connection.execute('INSERT INTO journal (name, value) VALUES (?, ?)', (journal, pickle.dumps(value)))
+
+    def drain(self, journal: str) -> List[Any]:
+        """
+        Take all values from the journal in the order they were appended.
+
+        :param journal: Name of the journal
+        :type journal: class: `str`
+        :return: List of values
+        :rtype: class: `list[Any]`
+        """
+        with self.lock():
+            rows = self._connection.execute('SELECT id, value FROM journal WHERE name = ? ORDER BY id',
+                                            (journal,)).fetchall()
+            if rows:
+                self._connection.execute('DELETE FROM journal WHERE name = ? AND id <= ?', (journal, rows[-1][0]))
+        return [pickle.loads(value) for _, value in rows]
+
+    def acquire(self, name: str, owner: str, ttl: float) -> bool:
+        """
+        Acquire or renew a lease, so that only one worker does some job.
+
+        :param name: Name of the lease
+        :type name: class: `str`
+        :param owner: Id of the worker
+        :type owner: class: `str`
+        :param ttl: Number of seconds the lease is valid for if it is not renewed
+        :type ttl: class: `float`
+        :return: True if the worker holds the lease, otherwise False
+        :rtype: class: `bool`
+        """
+        now = time.time()
+        with self.lock():
+            row = self._connection.execute('SELECT owner, expires FROM lease WHERE name = ?', (name,)).fetchone()
+            if row is not None and row[0] != owner and row[1] > now:
+                return False
+            self._connection.execute('INSERT OR REPLACE INTO lease (name, owner, expires) VALUES (?, ?, ?)',
+                                     (name, owner, now + ttl))
+        return True
+
+
+def create_store(url: Optional[str]) -> StateStore:
+    """
+    Create the state store by its URL.
+
+    :param url: "memory" or None for the in-process store, or "sqlite:///<path>" for the shared store
+    :type url: class: `str` or None
+    :return: State store
+    :rtype: class: `StateStore`
+    """
+    if url is None or url == 'memory':
+        return InProcessStore()
+    if url.startswith('sqlite:///'):
+        return SQLiteStore(url[len('sqlite:///'):])
+    raise ValueError(f'Unknown state store: {url}')
@@ -0,0 +1,87 @@
+"""Eviction of the abandoned entries of the server state."""
+
+import time
+import heapq
+import itertools
+from typing import Callable, Dict, List, Optional, Tuple
+from gevent.lock import RLock
+
+
+class Sweeper:
+    """
+    Schedule of the checks of the state entries that can be abandoned by crashed clients.
+
+    Entries are kept in a heap by the time they expire unless they are active again. When the time comes,
+    the entry is checked: if it was active since it was scheduled, it is scheduled again from its last activity,
+    otherwise it is evicted. So only the entries that may have expired are looked at.
+
+    :param ttls: Number of seconds without activity after which an entry is evicted, by state table
+    :type ttls: class: `dict[str, float]`
+    :param clock: Function returning the current time, defaults to `time.time`
+    :type clock: class: `Callable[[], float]`
+    """
+
+    def __init__(self, ttls: Dict[str, float], clock: Callable[[], float] = time.time) -> None:
+        """Make constructor method."""
+        self.ttls: Dict[str, float] = ttls
+        self.clock: Callable[[], float] = clock
+        self.evicted: Dict[str, int] = {table: 0 for table in ttls}
+        self._heap: List[Tuple[float, int, str, str]] = []
+        self._counter: itertools.count = itertools.count()
+        self._lock: RLock = RLock()
+
+    def schedule(self, table: str, key: str, active: Optional[float] = None) -> None:
+        """
+        Schedule the check of a state entry.
+
+        :param table: Name of the state table
+        :type table: class: `str`
+        :param key: Key of the entry
+        :type key: class: `str`
+        :param active: Time of the last activity of the entry, defaults to the current time
+        :type active: class: `float` or None
+        """
+        if active is None:
+            active = self.clock()
+
+        with self._lock:
+            heapq.heappush(self._heap, (active + self.ttls[table], next(self._counter), table, key))
+
+    def due(self) -> List[Tuple[str, str]]:
+        """
+        Take the entries whose checks are due.
+
+        :return: List of state tables and keys of the entries
+        :rtype: class: `list[tuple[str, str]]`
+        """
+        now = self.clock()
+        due = []
+
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                _, _, table, key = heapq.heappop(self._heap)
+                due.append((table, key))
+
+        return due
+
+    def next_check(self) -> Optional[float]:
+        """
+        Get the number of seconds until the next check.
+
+        :return: Number of seconds or None if no entry is scheduled
+        :rtype: class: `float` or None
+        """
+        with self._lock:
+            if not self._heap:
+                return None
+            return max(self._heap[0][0] - self.clock(), 0.0)
+
+    def stats(self) -> Dict[str, int]:
+        """
+        Get the numbers of evicted entries.
+
+        :return: Dictionary with the number of evicted entries and the number of scheduled checks
+        :rtype: class: `dict[str, int]`
+        """
+        with self._lock:
+            return {**self.evicted, 'scheduled': len(self._heap)}
@@ -0,0 +1,507 @@
+"""Tests of the online game server, run from the server directory with an in-memory database."""
+
+import os
+import time
+import uuid
+import random
+from types import SimpleNamespace
+import jwt
+
+os.environ['DATABASE_URI'] = 'sqlite://'
+
+import pytest  # noqa: E402  pylint: disable=wrong-import-position
+from sqlalchemy.exc import SQLAlchemyError  # noqa: E402  pylint: disable=wrong-import-position
+import server  # noqa: E402  pylint: disable=wrong-import-position
+from batch_writers import StatsBuffer  # noqa: E402  pylint: disable=wrong-import-position
+from game_record import Game, encode_game_over, encode_move, game_over_message  # noqa: E402  pylint: disable=C0413
+from state_store import InProcessStore, create_store  # noqa: E402  pylint: disable=wrong-import-position
+
+
+@pytest.fixture(name='players')
+def fixture_players():
+    """
+    Create two users and a game between them.
+
+    :return: Ids of the game and of the users, the first user moves first
+    :rtype: class: `tuple[str, str, str]`
+    """
+    with server.app.app_context():
+        first = server.create_user(f'first-{uuid.uuid4()}', 'password')
+        second = server.create_user(f'second-{uuid.uuid4()}', 'password')
+
+    game_id = server.create_game({'user_id': first, 'username': 'first', 'sign': 'X', 'turn': '1'},
+                                 {'user_id': second, 'username': 'second', 'sign': 'O', 'turn': '2'})
+    return game_id, first, second
+
+
+def received(client) -> list:
+    """
+    Get the names of the events received by a test client.
+
+    :param client: Socket.IO test client
+    :type client: class: `flask_socketio.SocketIOTestClient`
+    :return: Names of the events
+    :rtype: class: `list[str]`
+    """
+    return [message['name'] for message in client.get_received()]
+
+
+def token(user_id: str) -> str:
+    """
+    Make the token of a user.
+
+    :param user_id: Id of user
+    :type user_id: class: `str`
+    :return: Token
+    :rtype: class: `str`
+    """
+    return jwt.encode({'user_id': user_id}, server.app.secret_key, algorithm='HS256')
+
+
+def connect(user_id: str):
+    """
+    Connect a user to the game with a Socket.IO test client.
+
+    :param user_id: Id of user
+    :type user_id: class: `str`
+    :return: Socket.IO test client
+    :rtype: class: `flask_socketio.SocketIOTestClient`
+    """
+    return server.socketio.test_client(server.app, headers={'Cookie': f'token={token(user_id)}'})
+
+
+def profile(user_id: str) -> dict:
+    """
+    Load the profile of a user with the results that are not written to the database yet.
+
+    :param user_id: Id of user
+    :type user_id: class: `str`
+    :return: Profile of user
+    :rtype: class: `dict`
+    """
+    with server.app.app_context():
+        return server.load_profile(server.User.id == user_id)
+
+
+def archived_games() -> int:
+    """
+    Get the number of finished games put into the history queue.
+
+    :return: Number of queued and written games
+    :rtype: class: `int`
+    """
+    stats = server.history.stats()
+    return stats['queued'] + stats['written']
+
+
+def test_ready_timeout_forfeits_absent_player(players, monkeypatch):
+    """The player who never connects loses when `READY_TIMEOUT` passes, and the other player is told so."""
+    game_id, first, second = players
+    monkeypatch.setitem(server.app.config, 'READY_TIMEOUT', 0.01)
+
+    client = connect(first)
+    server.socketio.sleep(0.1)
+
+    assert 'opponent_reset' in received(client)
+    assert server.store.get('games', game_id).winner == first
+    assert profile(first)['friend_stat']['Player1_win'] == 1
+    assert profile(second)['friend_stat']['Player2_win'] == 1
+    client.disconnect()
+
+
+def test_reconnect_grace_forfeits_away_player(players, monkeypatch):
+    """The player who loses the connection and does not come back in `RECONNECT_GRACE` loses the game."""
+    game_id, first, second = players
+    monkeypatch.setitem(server.app.config, 'RECONNECT_GRACE', 0.01)
+    archived = archived_games()
+
+    first_client = connect(first)
+    second_client = connect(second)
+    second_client.disconnect()
+    server.socketio.sleep(0.1)
+
+    assert received(first_client)[-2:] == ['opponent_away', 'opponent_reset']
+    assert server.store.get('games', game_id).winner == first
+    assert server.store.get('user_games', second) is None
+    assert profile(second)['friend_stat']['Player2_win'] == 1
+    assert archived_games() == archived + 1
+    first_client.disconnect()
+
+
+def test_join_queue_rejects_unknown_choices():
+    """A request to join the queue with an unknown sign or turn is rejected and does not reach the matcher."""
+    with server.app.app_context():
+        user_id = server.create_user(f'player-{uuid.uuid4()}', 'password')
+
+    client = server.app.test_client()
+    client.set_cookie('token', token(user_id))
+
+    response = client.post('/join_queue', json={'sign': 'Z', 'turn': '1'})
+
+    assert response.get_json()['message'] == 'Invalid sign or turn'
+    assert not server.is_queued(user_id)
+
+
+def test_matcher_survives_failed_pass(monkeypatch):
+    """The matcher greenlet keeps pairing players after a pass raises an exception."""
+    calls = []
+
+    def failing_matcher(leader: bool) -> bool:
+        calls.append(leader)
+        if len(calls) == 1:
+            raise KeyError('bad entry')
+        return True
+
+    monkeypatch.setattr(server, 'run_matcher', failing_matcher)
+    for _ in range(2):
+        server.queue_event.set()
+        server.socketio.sleep(3 * server.app.config['MATCH_TICK'])
+
+    assert len(calls) >= 2
+    assert calls[1] is False
+
+
+def test_moves_and_resets_are_made_only_for_the_connected_user(players):
+    """A socket cannot move or forfeit for another user by naming that user or a foreign game in the event."""
+    game_id, first, second = players
+    with server.app.app_context():
+        intruder_id = server.create_user(f'intruder-{uuid.uuid4()}', 'password')
+        other_id = server.create_user(f'other-{uuid.uuid4()}', 'password')
+    server.create_game({'user_id': intruder_id, 'username': 'intruder', 'sign': 'X', 'turn': '1'},
+                       {'user_id': other_id, 'username': 'other', 'sign': 'O', 'turn': '2'})
+
+    first_client = connect(first)
+    second_client = connect(second)
+    intruder = connect(intruder_id)
+
+    second_client.emit('play', {'user_id': first, 'game_id': game_id, 'pos': 4})
+    assert server.store.get('games', game_id).moves == 0
+
+    first_client.emit('play', {'user_id': first, 'game_id': game_id, 'pos': 4})
+    assert server.store.get('games', game_id).history == bytes((4,))
+
+    intruder.emit('reset_game', {'user_id': second, 'game_id': game_id, 'opponent_id': first})
+    assert not server.store.get('games', game_id).over
+    assert server.store.get('user_games', first) == game_id
+
+    first_client.disconnect()
+    second_client.disconnect()
+
+
+def test_empty_binary_move_is_ignored(players):
+    """A binary payload that is not one byte is ignored like other invalid moves."""
+    game_id, first, second = players
+    first_client = connect(first)
+    second_client = connect(second)
+
+    first_client.emit('play', b'')
+    first_client.emit('play', encode_move(0, 4) + b'\x00')
+    assert server.store.get('games', game_id).moves == 0
+
+    first_client.emit('play', encode_move(0, 4))
+    assert server.store.get('games', game_id).history == bytes((4,))
+
+    first_client.disconnect()
+    second_client.disconnect()
+
+
+def client_decoder(monkeypatch):
+    """
+    Get the decoder of the game results of the client, skipping the test if the client cannot be imported.
+
+    :param monkeypatch: Pytest fixture to put the client package on the import path
+    :type monkeypatch: class: `pytest.MonkeyPatch`
+    :return: Function decoding a result for a player
+    :rtype: class: `Callable[[bytes, int, tuple[str, str]], dict[str, str | int | bool | None]]`
+    """
+    for name in ('tkinter', 'pygame', 'requests', 'socketio'):
+        pytest.importorskip(name)
+    monkeypatch.syspath_prepend(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    game_page = pytest.importorskip('OnlineTicTacToe.game_page')
+
+    def decode(data: bytes, number: int, player_ids: tuple) -> dict:
+        page = SimpleNamespace(turn='Your turn' if number == 0 else 'Waiting', opponent_id=player_ids[1 - number],
+                               master=SimpleNamespace(user_id=player_ids[number]))
+        return game_page.FriendGame._decode_game_over(page, data)  # pylint: disable=protected-access
+
+    return decode
+
+
+@pytest.mark.parametrize('moves', [(0, 3, 1, 4, 2), (0, 3, 1, 4, 8, 5), (0, 1, 2, 4, 3, 5, 7, 6, 8)],
+                         ids=['first wins', 'second wins', 'draw'])
+def test_binary_messages_round_trip(moves, monkeypatch):
+    """A move and the result of a game decode to the same data as the dictionaries of the text protocol."""
+    for seq in (0, 5, 8):
+        for pos in range(9):
+            data = encode_move(seq, pos)
+            assert len(data) == 1 and (data[0] >> 4, data[0] & 0xF) == (seq, pos)
+
+    game = Game(('first', 'second'), 'XO', ('first', 'second'), 0.0)
+    game.started = True
+    for seq, pos in enumerate(moves):
+        game.play(game.player_ids[seq % 2], pos, 0.0)
+    assert game.over
+
+    texts = [game_over_message(game, number) for number in range(2)]
+    game.binary = 0b11
+    binaries = [game_over_message(game, number) for number in range(2)]
+    winner = None if game.winner is None else game.index(game.winner)
+    assert binaries[0] == binaries[1] == encode_game_over(len(moves) - 1, moves[-1], winner,
+                                                          None if winner is None else game.line(winner))
+    assert binaries[0][0] >> 4 == len(moves) - 1 and binaries[0][0] & 0xF == texts[0]['pos'] == moves[-1]
+
+    decode = client_decoder(monkeypatch)
+    for number in range(2):
+        assert decode(binaries[number], number, game.player_ids) == texts[number]
+
+
+def test_failed_stats_flush_puts_changes_back():
+    """The changes of a failed flush are put back before the newer ones and merged with the results added meanwhile."""
+    batches = []
+
+    def write(batch):
+        batches.append(batch)
+        if len(batches) == 1:
+            buffer.add(server.OnlineGameStat, 'first', {'games_played': 1, 'games_won': 1})
+            raise SQLAlchemyError('database is locked')
+
+    buffer = StatsBuffer(2, write)
+    buffer.add(server.OnlineGameStat, 'first', {'games_played': 1, 'games_defeat': 1, 'rating': -10.0})
+    buffer.add(server.OnlineGameStat, 'second', {'games_played': 1, 'games_won': 1, 'rating': 10.0})
+    buffer.add(server.OnlineGameStat, 'third', {'games_played': 1})
+
+    assert buffer.flush() == 0
+    assert buffer.stats()['failed'] == 1 and len(buffer) == 3
+    assert buffer.pending(server.OnlineGameStat, 'first') == {'games_played': 2, 'games_defeat': 1, 'games_won': 1,
+                                                              'rating': -10.0}
+
+    assert buffer.flush() == 2
+    assert batches[1] == [(server.OnlineGameStat, 'first', {'games_played': 2, 'games_defeat': 1, 'games_won': 1,
+                                                            'rating': -10.0}),
+                          (server.OnlineGameStat, 'second', {'games_played': 1, 'games_won': 1, 'rating': 10.0})]
+    assert buffer.users(server.OnlineGameStat) == ['third']
+    assert buffer.flush() == 1 and not buffer.users(server.OnlineGameStat)
+
+
+def test_profile_read_during_stats_flush_sees_all_results(monkeypatch):
+    """A profile read while a flush is writing has both the results being written and the ones added meanwhile."""
+    with server.app.app_context():
+        user_id = server.create_user(f'reader-{uuid.uuid4()}', 'password')
+    while server.stats_buffer.flush():
+        pass
+    server.count_result(server.ComputerGameStat, user_id, 'win')
+    reads = []
+
+    def write(batch):
+        reads.append(profile(user_id)['pc_stat'])
+        server.count_result(server.ComputerGameStat, user_id, 'defeat')
+        reads.append(profile(user_id)['pc_stat'])
+        server.write_stats(batch)
+
+    monkeypatch.setattr(server.stats_buffer, 'write', write)
+    assert server.stats_buffer.flush() == 1
+
+    assert reads == [{'drawn_game': 0, 'Player_win': 1, 'Computer_win': 0},
+                     {'drawn_game': 0, 'Player_win': 1, 'Computer_win': 1}]
+    assert server.stats_buffer.pending(server.ComputerGameStat, user_id) == {'games_played': 1, 'games_defeat': 1}
+    assert profile(user_id)['pc_stat'] == {'drawn_game': 0, 'Player_win': 1, 'Computer_win': 1}
+
+
+def test_leaderboard_reload_counts_pending_ratings(monkeypatch):
+    """The top loaded again has every user once with the rating changes that are not written yet."""
+    with server.app.app_context():
+        winner = server.create_user(f'winner-{uuid.uuid4()}', 'password')
+        loser = server.create_user(f'loser-{uuid.uuid4()}', 'password')
+        server.record_result(winner, loser, False)
+        size = server.User.query.count()
+        monkeypatch.setattr(server, 'leaderboard', server.Leaderboard(size))
+        users = server.load_top(size)
+        expected = {user_id: server.db.session.get(server.OnlineGameStat, user_id).rating
+                    + server.stats_buffer.pending(server.OnlineGameStat, user_id).get('rating', 0.0)
+                    for user_id in (winner, loser)}
+
+    ids = [user_id for user_id, _, _ in users]
+    ratings = {user_id: rating for user_id, _, rating in users}
+    assert len(ids) == len(set(ids)) == size
+    assert ratings[winner] == expected[winner]
+    assert ratings[loser] == expected[loser]
+    assert ratings[winner] > server.app.config['RATING_DEFAULT'] > ratings[loser]
+    assert [rating for _, _, rating in users] == sorted(ratings.values(), reverse=True)
+
+
+def test_new_user_joins_top_that_is_not_full(monkeypatch):
+    """A new user is put into the top while the top has fewer users than its size."""
+    monkeypatch.setattr(server, 'leaderboard', server.Leaderboard(10 ** 6))
+    with server.app.app_context():
+        server.leaderboard.load(server.load_top(server.leaderboard.size))
+        user_id = server.create_user(f'newcomer-{uuid.uuid4()}', 'password')
+
+    assert server.leaderboard.rating(user_id) == server.app.config['RATING_DEFAULT']
+
+
+def test_leaderboard_page_clamps_limit_and_sees_other_workers():
+    """A page has at least one user, and the top is loaded again after another worker writes ratings."""
+    with server.app.app_context():
+        user_id = server.create_user(f'climber-{uuid.uuid4()}', 'password')
+    client = server.app.test_client()
+
+    for limit in (0, -1):
+        assert len(client.get(f'/leaderboard?limit={limit}').get_json()['players']) == 1
+
+    with server.app.app_context():
+        server.db.session.get(server.OnlineGameStat, user_id).rating = 10 ** 6
+        server.db.session.commit()
+    server.store.set('versions', 'ratings', server.store.get('versions', 'ratings') + 1)
+
+    assert client.get('/leaderboard?limit=1').get_json()['players'][0]['user_id'] == user_id
+
+
+def test_profile_cache_sees_statistics_written_by_other_workers():
+    """A cached profile is loaded again after another worker writes the statistics of its user."""
+    with server.app.app_context():
+        user_id = server.create_user(f'cached-{uuid.uuid4()}', 'password')
+    client = server.app.test_client()
+    client.set_cookie('token', token(user_id))
+    assert client.get('/').get_json()['friend_stat']['Player1_win'] == 0
+    assert client.get('/').get_json()['friend_stat']['Player1_win'] == 0
+    hits = server.profiles.stats()['hits']
+
+    with server.app.app_context():
+        server.db.session.get(server.OnlineGameStat, user_id).games_won = 1
+        server.db.session.commit()
+    server.store.set('profile_versions', user_id, (server.store.get('profile_versions', user_id) or 0) + 1)
+
+    assert client.get('/').get_json()['friend_stat']['Player1_win'] == 1
+    assert server.profiles.stats()['hits'] == hits
+
+
+def test_waiting_queue_breaks_pair_to_match_more_users():
+    """A user left without an opponent takes a player of an earlier pair whose partner can play with someone else."""
+    waiting = server.WaitingQueue(100, 200, 1, 400, 30, 100, clock=lambda: 1.0)
+    for joined, (user_id, sign, turn) in enumerate((('A', 'X', '1'), ('C', 'R', '2'), ('B', 'O', '0'),
+                                                    ('E', 'O', '1'))):
+        waiting.push(user_id, sign, turn, 1500, joined / 10)
+
+    pairs = {(first['user_id'], second['user_id']) for first, second in waiting.pop_pairs()}
+
+    assert pairs == {('A', 'B'), ('C', 'E')}
+    assert len(waiting) == 0
+    assert waiting.stats()['matches'] == 2
+
+
+def test_waiting_queue_relaxes_choices_of_both_users():
+    """Users with incompatible choices are paired only when the choices of both of them have become soft."""
+    now = [0.0]
+    waiting = server.WaitingQueue(100, 200, 1, 400, 30, 100, clock=lambda: now[0])
+    waiting.push('A', 'X', '1', 1500, 0.0)
+    assert not waiting.pop_pairs()
+
+    now[0] = 31.0
+    waiting.push('B', 'X', '1', 1500, 31.0)
+    assert not waiting.pop_pairs()
+    assert waiting.next_check() == 30.0
+
+    now[0] = 61.0
+    pairs = [(first['user_id'], second['user_id']) for first, second in waiting.pop_pairs()]
+
+    assert pairs == [('A', 'B')]
+    stats = waiting.stats()
+    assert stats['relaxed_matches'] == 1
+    assert (stats['relaxed_wait_p50'], stats['relaxed_wait_p99']) == (61.0, 61.0)
+    assert stats['strict_wait_p50'] == 0.0
+
+
+def test_waiting_queue_pairs_burst_quickly():
+    """A burst of users with mostly the same choices is paired with a bounded number of searches per user."""
+    rnd = random.Random(1)
+    choices = [('X', '1')] * 50 + [(sign, turn) for sign in 'XOR' for turn in '120'][1:]
+    greedy, augmented = (server.WaitingQueue(100, 200, 1, 400, 30, 100, candidates, clock=lambda: 0.0)
+                         for candidates in (0, 8))
+    for number in range(20000):
+        sign, turn = rnd.choice(choices)
+        rating = rnd.gauss(1500, 150)
+        greedy.push(str(number), sign, turn, rating, 0.0)
+        augmented.push(str(number), sign, turn, rating, 0.0)
+
+    greedy_pairs = greedy.pop_pairs()
+    start = time.perf_counter()
+    pairs = augmented.pop_pairs()
+
+    assert time.perf_counter() - start < 5.0
+    assert len(pairs) >= len(greedy_pairs)
+
+
+def test_deployment_needs_shared_store_and_message_queue():
+    """Several workers are refused without a shared state store, and a shared store without a message queue."""
+    with pytest.raises(ValueError):
+        server.check_deployment(2, False, None)
+    with pytest.raises(ValueError):
+        server.check_deployment(1, True, None)
+
+    server.check_deployment(1, False, None)
+    server.check_deployment(2, True, 'redis://localhost:6379')
+
+
+def test_sqlite_store_blocks_are_transactions(tmp_path):
+    """A block of operations of one worker is seen by another worker only when it is committed, or never."""
+    first, second = (create_store(f'sqlite:///{tmp_path / "state.db"}') for _ in range(2))
+
+    with first.lock():
+        first.set('games', 'game', 1)
+        assert second.get('games', 'game') is None
+    assert second.get('games', 'game') == 1
+
+    with pytest.raises(KeyError), first.lock():
+        first.set('games', 'game', 2)
+        raise KeyError('game')
+    assert second.get('games', 'game') == 1
+
+    assert first.add('queue', 'user', 'first')
+    assert not second.add('queue', 'user', 'second')
+    assert second.pop('queue', 'user') == 'first'
+    assert first.get('queue', 'user') is None
+
+
+def test_sqlite_store_journal_is_drained_once(tmp_path):
+    """The values pushed to a journal by any worker are drained by one of them in the order they were pushed."""
+    first, second = (create_store(f'sqlite:///{tmp_path / "state.db"}') for _ in range(2))
+    for store, value in ((first, 1), (second, 2), (first, 3)):
+        store.push('results', value)
+
+    assert second.drain('results') == [1, 2, 3]
+    assert first.drain('results') == []
+
+
+def test_sqlite_store_lease_has_one_owner(tmp_path):
+    """A lease is held by one worker until it stops renewing it and the lease expires."""
+    first, second = (create_store(f'sqlite:///{tmp_path / "state.db"}') for _ in range(2))
+
+    assert first.acquire('matcher', 'first', 0.1)
+    assert not second.acquire('matcher', 'second', 0.1)
+    assert first.acquire('matcher', 'first', 0.1)
+
+    time.sleep(0.2)
+    assert second.acquire('matcher', 'second', 0.1)
+    assert not first.acquire('matcher', 'first', 0.1)
+
+
+def test_live_games_limit_is_clamped(players):
+    """A negative limit gives an empty list, and the list is never longer than the limit."""
+    first_client, second_client = (connect(user_id) for user_id in players[1:])
+    client = server.app.test_client()
+
+    assert client.get('/live_games?limit=-1').get_json()['games'] == []
+    assert len(client.get('/live_games?limit=1').get_json()['games']) == 1
+
+    first_client.disconnect()
+    second_client.disconnect()
+
+
+def test_store_items_are_bounded(tmp_path):
+    """Both stores give at most as many keys and values of a table as asked for."""
+    for store in (InProcessStore(), create_store(f'sqlite:///{tmp_path / "state.db"}')):
+        for number in range(3):
+            store.set('live', str(number), number)
+
+        assert len(store.items('live', 2)) == 2
+        assert sorted(store.items('live')) == [('0', 0), ('1', 1), ('2', 2)]